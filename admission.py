@@ -0,0 +1,224 @@
+"""
+Process-wide admission control for the Azure OpenAI quota.
+
+Requests from all sessions pass through one controller: token buckets limit
+requests per minute and tokens per minute, waiting requests are admitted in
+FIFO order from a bounded queue, and connection errors, timeouts and 429 / 5xx
+responses are retried with jittered exponential backoff. A Retry-After header
+on a 429 holds back every queued request until it has passed.
+"""
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+
+# Default limits
+REQUESTS_PER_MINUTE = 60
+TOKENS_PER_MINUTE = 60000
+MAX_QUEUE_SIZE = 50
+MAX_RETRIES = 3
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 20.0
+RETRY_AFTER_CAP = 60.0
+RECENT_WAITS = 200
+
+# Exceptions that mean the request did not get through, matched by class name so
+# the OpenAI SDK and httpx need not be imported here
+CONNECTION_ERRORS = ("APIConnectionError", "APITimeoutError", "TransportError")
+
+
+class QueueFullError(Exception):
+    """
+    Raised when the admission queue has no room left.
+    """
+
+
+class TokenBucket:
+    """
+    Refills at rate_per_minute / 60 units per second up to capacity.
+    Not thread-safe on its own; the controller holds the lock.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = None, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until amount can be taken; 0 if it is available now.
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class Ticket:
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        self.wait_time = 0.0
+
+
+class AdmissionController:
+    """
+    Admits requests in arrival order when both buckets allow it.
+    """
+
+    def __init__(self, requests_per_minute: float = REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = TOKENS_PER_MINUTE, max_queue_size: int = MAX_QUEUE_SIZE,
+                 max_retries: int = MAX_RETRIES, backoff_base: float = BACKOFF_BASE,
+                 backoff_cap: float = BACKOFF_CAP):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_queue_size = max_queue_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.stats = {"admitted": 0, "rejected": 0, "retries": 0, "max_queue_depth": 0}
+        self._queue = deque()
+        self._waits = deque(maxlen=RECENT_WAITS)
+        self._cond = threading.Condition()
+        # Set from a 429's Retry-After, holds back the whole queue
+        self._paused_until = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def _wait_estimate(self, ticket: Ticket) -> float:
+        """
+        Rough wait for a ticket: bucket delay of everything ahead of it.
+        """
+        ahead_requests = 0
+        ahead_tokens = 0
+        for queued in self._queue:
+            ahead_requests += 1
+            ahead_tokens += queued.tokens
+            if queued is ticket:
+                break
+        return max(self.requests.wait_time(ahead_requests), self.tokens.wait_time(ahead_tokens))
+
+    def acquire(self, tokens: int, on_wait=None) -> Ticket:
+        """
+        Blocks until the request may be sent. on_wait(position, estimate) is
+        called while the request is queued, e.g. to show the queue position.
+        """
+        ticket = Ticket(tokens)
+        with self._cond:
+            if len(self._queue) >= self.max_queue_size:
+                self.stats["rejected"] += 1
+                raise QueueFullError("Too many requests are waiting")
+            self._queue.append(ticket)
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], len(self._queue))
+            try:
+                while True:
+                    if self._queue[0] is ticket:
+                        delay = max(self.requests.wait_time(1), self.tokens.wait_time(tokens),
+                                    self._paused_until - time.monotonic())
+                        if delay == 0:
+                            break
+                    else:
+                        delay = 0.5
+                    if on_wait is not None:
+                        position, estimate = self._queue.index(ticket) + 1, self._wait_estimate(ticket)
+                        # Do not hold the lock while the caller updates the UI
+                        self._cond.release()
+                        try:
+                            on_wait(position, estimate)
+                        finally:
+                            self._cond.acquire()
+                    self._cond.wait(timeout=min(delay, 0.5))
+                self.requests.take(1)
+                self.tokens.take(tokens)
+                ticket.wait_time = time.monotonic() - ticket.enqueued_at
+                self.stats["admitted"] += 1
+                self._waits.append(ticket.wait_time)
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+        return ticket
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        if isinstance(error, (ConnectionError, TimeoutError)):
+            return True
+        if any(cls.__name__ in CONNECTION_ERRORS for cls in type(error).__mro__):
+            return True
+        status = getattr(error, "status_code", None)
+        return status is not None and (status == 429 or status >= 500)
+
+    @staticmethod
+    def retry_after(error: Exception):
+        """
+        Seconds the server asked to wait (retry-after-ms or Retry-After), or None.
+        """
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        if not headers:
+            return None
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            value = headers.get("retry-after")
+            if not value:
+                return None
+            try:
+                return float(value)
+            except ValueError:
+                # HTTP date
+                return email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+
+    def call(self, fn, tokens: int, on_wait=None, sleep=time.sleep):
+        """
+        Acquires a slot and calls fn(), retrying connection errors, timeouts and
+        429 / 5xx with jittered backoff, or after the Retry-After of a 429.
+        Each retry goes through admission again. Returns (result, ticket).
+        """
+        attempt = 0
+        while True:
+            ticket = self.acquire(tokens, on_wait)
+            try:
+                return fn(), ticket
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_retryable(e):
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                # Full jitter backoff
+                delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                retry_after = self.retry_after(e) if getattr(e, "status_code", None) == 429 else None
+                if retry_after is not None and retry_after > 0:
+                    # The quota is shared, so the whole queue waits, not only this request
+                    retry_after = min(retry_after, RETRY_AFTER_CAP)
+                    with self._cond:
+                        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                    delay = max(delay, retry_after)
+                sleep(delay)
+
+    def summary(self) -> dict:
+        """
+        Queue depth and wait time statistics.
+        """
+        waits = sorted(self._waits)
+        return {
+            **self.stats,
+            "queue_depth": self.queue_depth,
+            "wait_p50": waits[len(waits) // 2] if waits else None,
+            "wait_max": waits[-1] if waits else None
+        }
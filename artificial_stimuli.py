@@ -1,5 +1,6 @@
 import streamlit as st
-import time
+from pacing import Pacer, load_trace
+from stimuli import load_stimuli
 
 # Configuration for the page
 st.set_page_config(page_title="Mental Health Assistant", page_icon="💙")
@@ -7,71 +8,50 @@ st.set_page_config(page_title="Mental Health Assistant", page_icon="💙")
 # --- Configuration ---
 ENABLE_REASONING = False # Set to False to disable reasoning display globally
 
-# Predefined responses: keyword -> {reasoning, output}
-# You can extend this dictionary with more keywords and responses.
-predefined_responses = {
-    "defaultt": {
-        "reasoning": "The user is deeply concerned about a friend expressing hopelessness. First, assess for immediate suicide risk — ask about specific plans or means. If danger is urgent, recommend emergency services. Show empathy, guide the user in using nonjudgmental, validating communication. Suggest gentle ways to encourage professional help, like hotlines or online therapy, especially if the friend resists formal care. Support the user’s own well-being — remind them to set boundaries and seek support too. Avoid diagnosing; offer clear, compassionate, actionable steps and resources.",
-        "output": """**That sounds really tough. I'm here to help you figure out how to support your friend.**
-#### 1. Check safety first
-Gently ask if they’re thinking about suicide—this **does not increase risk** and may **reduce distress.** 📖 *Dazzi et al., 2014, Int. J. Ment. Health Syst.* ([PubMed](https://streamlit.io))
-#### 2. Listen and validate
-Let them talk without judgment; say things like “Thank you for telling me.” 📖 *Mental Health Commission of Canada - Be There Guide* ([BeThe1To](https://streamlit.io))
-#### 3. Suggest low-barrier help
-Recommend 24/7 anonymous support (text/chat/phone); stay with them if needed. 📖 *Befrienders Worldwide* ([Website](https://streamlit.io))
-#### 4. Reduce risks and plan safety
-Lock away harmful items and agree on a follow-up plan and emergency contacts. 📖 *WHO, 2014. Preventing suicide: A global imperative* ([WHO](https://streamlit.io))
-#### 5. Take care of yourself
-Supporting others is hard—lean on your own support system and routines.
+# Canned responses with their keywords, see stimuli.py for the file format
+STIMULI_FILE = "stimuli.json"
 
-💥 *If they’re in immediate danger, call emergency services right away.*
+# Pacing of the streamed responses, see pacing.py
+PACING_MODE = "cps" # "cps" (characters/s), "tps" (tokens/s) or "replay" (recorded timings)
+REASONING_RATE = 60 # Characters or tokens per second of the reasoning
+OUTPUT_RATE = 60 # Characters or tokens per second of the output
+THINKING_DELAY = 0.5 # Seconds before the first word (drawn from the trace in replay mode)
+REASONING_PAUSE = 3 # Seconds between the reasoning and the output
+PACING_TRACE_FILE = None # Token trace (TOKEN_TRACE_FILE) or metrics JSON lines of llm_app.py runs, for jitter and replay
+PACING_SEED = 0 # The same seed and prompt always give the same timing
 
-Even just being present can help save a life!
-#### [Sources](https://streamlit.io)
-"""
-    },
-    "default": {
-        "reasoning": "The user is deeply concerned about a friend expressing hopelessness. First, assess for immediate suicide risk — ask about specific plans or means. If danger is urgent, recommend emergency services. Show empathy, guide the user in using nonjudgmental, validating communication. Suggest gentle ways to encourage professional help, like hotlines or online therapy, especially if the friend resists formal care. Support the user’s own well-being — remind them to set boundaries and seek support too. Avoid diagnosing; offer clear, compassionate, actionable steps and resources.",
-        "output": """**That sounds really tough. I'm here to help you figure out how to support your friend.**
-#### 1. Check safety first
-Gently ask if they’re thinking about suicide—this **does not increase risk** and may **reduce distress.**
-#### 2. Listen and validate
-Let them talk without judgment; say things like “Thank you for telling me.”
-#### 3. Suggest low-barrier help
-Recommend 24/7 anonymous support (text/chat/phone); stay with them if needed.
-#### 4. Reduce risks and plan safety
-Lock away harmful items and agree on a follow-up plan and emergency contacts.
-#### 5. Take care of yourself
-Supporting others is hard—lean on your own support system and routines.
-
-💥 *If they’re in immediate danger, call emergency services right away.*
+@st.cache_resource
+def get_stimuli():
+    """
+    Loads the stimulus file once per process; keyword matching and the streamed
+    chunks of every response are precomputed.
+    """
+    return load_stimuli(STIMULI_FILE)
 
-Even just being present can help save a life!
-"""
+@st.cache_resource
+def get_pacers():
+    """
+    Builds the reasoning and output pacers once per process.
+    """
+    trace = load_trace(PACING_TRACE_FILE) if PACING_TRACE_FILE else None
+    return {
+        "reasoning": Pacer(PACING_MODE, REASONING_RATE, ttft=THINKING_DELAY, trace=trace, seed=PACING_SEED),
+        "output": Pacer(PACING_MODE, OUTPUT_RATE, ttft=THINKING_DELAY, trace=trace, seed=PACING_SEED)
     }
-}
 
 def get_bot_response_data(user_input: str):
     """
-    Retrieves the bot's response data based on simple keyword matching.
+    Retrieves the bot's response data for the highest-priority keyword in the input.
     """
-    user_input_lower = user_input.lower()
-    for keyword, response_data in predefined_responses.items():
-        if keyword in user_input_lower:
-            return response_data
-    return predefined_responses["default"]
+    return get_stimuli().match(user_input)
 
-def stream_text_generator(text: str, delay: float = 0.03):
+def stream_text_generator(chunks, pacer: Pacer, seed: str, first: bool = True, lead: float = 0.0):
     """
-    A generator function that yields words of a text one by one with a delay.
+    Yields the precomputed words of a text on the pacer's schedule; the thinking
+    delay is only added to the first streamed text of a response, and lead is
+    waited before the first word.
     """
-    words = text.split(' ')
-    for i, word in enumerate(words):
-        if i < len(words) - 1:
-            yield word + " "
-        else:
-            yield word  # No trailing space for the last word
-        time.sleep(delay)
+    return pacer.stream(chunks, seed=seed, first=first, lead=lead)
 
 # --- Streamlit App UI ---
 st.title("Mental Health Assistant 💙")
@@ -92,7 +72,7 @@ for message in st.session_state.messages:
 
 # Accept user input
 if prompt := st.chat_input("Ask me something..."):
-    time.sleep(0.5)
+    pacers = get_pacers()
     # Add user message to chat history
     st.session_state.messages.append({"role": "user", "content": prompt})
     # Display user message
@@ -102,7 +82,6 @@ if prompt := st.chat_input("Ask me something..."):
     # Get bot's response data
     bot_response_data = get_bot_response_data(prompt)
     reasoning_text = bot_response_data["reasoning"]
-    output_text = bot_response_data["output"]
 
     # Display assistant response
     with st.chat_message("assistant", avatar="💙"):
@@ -110,15 +89,15 @@ if prompt := st.chat_input("Ask me something..."):
         if ENABLE_REASONING: # Use ENABLE_REASONING
             with st.expander("Thought process:", expanded=True):
                 # Stream the reasoning text
-                streamed_reasoning = st.write_stream(stream_text_generator(reasoning_text, delay=0.1)) # Slower reasoning stream
+                streamed_reasoning = st.write_stream(stream_text_generator(bot_response_data["reasoning_chunks"], pacers["reasoning"], prompt))
         else:
             streamed_reasoning = reasoning_text # Store the raw text if not displayed
 
-        # Add a delay after reasoning is streamed (or would have been)
-        time.sleep(3) # Delay for 1 second
-
-        # Stream the output text
-        streamed_content = st.write_stream(stream_text_generator(output_text, delay=0.10)) # Slower output stream
+        # Stream the output text, after the pause that follows the reasoning (or would have)
+        streamed_content = st.write_stream(stream_text_generator(
+            bot_response_data["output_chunks"], pacers["output"], prompt, first=not ENABLE_REASONING,
+            lead=REASONING_PAUSE
+        ))
     
     # Add assistant response (with full content after streaming) to chat history
     st.session_state.messages.append({
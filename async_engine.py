@@ -0,0 +1,194 @@
+"""
+Asyncio streaming engine shared by all sessions of the process.
+
+Generation runs on one event loop in a background thread: the engine opens the
+completion stream with AsyncAzureOpenAI, parses it with StreamParser, enforces
+the section budgets and publishes section-tagged events into a per-session
+queue. The Streamlit script thread only consumes that queue at its own pace,
+so many sessions share the loop for network I/O instead of each blocking a
+thread in socket reads.
+"""
+import asyncio
+import queue
+import threading
+import time
+
+from stream_parser import StreamParser, ANSWER, SOURCES
+
+_DONE = object()
+
+
+class Generation:
+    """
+    Handle of one streamed response. Iterating it yields (section, text)
+    events; exceptions from the upstream are re-raised in the consumer.
+    """
+
+    def __init__(self, engine, parser: StreamParser, budget=None):
+        self.engine = engine
+        self.parser = parser
+        self.budget = budget
+        self.chunks = 0
+        self.first_token_at = None
+        self.last_token_at = None
+        self.token_gaps = []
+        # Section -> time its marker was read, before any pacing of the consumer
+        self.section_started_at = {}
+        self.finished_at = None
+        self.usage = None
+        self.cut_off = None
+        self.cancelled = False
+        self.done = threading.Event()
+        self._queue = queue.Queue()
+        # An item taken off the queue by take_buffered() that belongs to the iterator
+        self._held = None
+        self._future = None
+
+    def __iter__(self):
+        while True:
+            if self._held is not None:
+                item, self._held = self._held, None
+            else:
+                item = self._queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def take_buffered(self, section: str) -> str:
+        """
+        Returns the text of a section that has been received but not consumed
+        yet, without waiting for more. Stops at the first event of another
+        section, which is left for the iterator.
+        """
+        parts = []
+        while self._held is None:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, tuple) and item[0] == section and item[1]:
+                parts.append(item[1])
+            else:
+                self._held = item
+        return "".join(parts)
+
+    def close(self):
+        """
+        Cancels the generation; the upstream stream is closed by the loop.
+        """
+        self.cancelled = True
+        if self._future is not None and not self._future.done():
+            self._future.cancel()
+
+    def _publish(self, events):
+        for section, text in events:
+            if not text:
+                self.section_started_at.setdefault(section, time.monotonic())
+            self._queue.put((section, text))
+
+    def _handle_delta(self, delta: str, last_section: str) -> bool:
+        """
+        Parses one delta and applies the section budget. Returns False once the
+        stream should be closed.
+        """
+        section = self.parser.section
+        if self.budget is not None and not self.budget.consume(section):
+            self.cut_off = section
+            if section == last_section:
+                # Nothing else is expected, stop paying for the rest
+                return False
+            # Drop the overflow until the next section starts, both from the
+            # live view and from the sections that are stored
+            self.parser.mute(section)
+        self._publish(self.parser.feed(delta))
+        return True
+
+    async def _run(self, stream):
+        last_section = SOURCES if self.parser.has_sources else ANSWER
+        try:
+            if hasattr(stream, "__aiter__"):
+                async for chunk in stream:
+                    if not self._on_chunk(chunk, last_section):
+                        break
+            else:
+                # Replayed responses are plain iterables
+                for chunk in stream:
+                    if not self._on_chunk(chunk, last_section):
+                        break
+            self._publish(self.parser.finish())
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self._queue.put(e)
+        finally:
+            self.finished_at = time.monotonic()
+            try:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    result = close()
+                    if asyncio.iscoroutine(result):
+                        await result
+            except Exception:
+                # The response is complete or abandoned, a failed close changes nothing for the consumer
+                pass
+            finally:
+                # Always reached, the consumer blocks on the queue until _DONE arrives
+                self.done.set()
+                self._queue.put(_DONE)
+
+    def _on_chunk(self, chunk, last_section: str) -> bool:
+        if chunk.usage:
+            # Sent on the last chunk with stream_options include_usage
+            self.usage = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content is not None:
+            now = time.monotonic()
+            if self.chunks == 0:
+                self.first_token_at = now
+            else:
+                self.token_gaps.append(now - self.last_token_at)
+            self.last_token_at = now
+            self.chunks += 1
+            return self._handle_delta(chunk.choices[0].delta.content, last_section)
+        return True
+
+
+class StreamingEngine:
+    """
+    Owns the shared event loop and the async client created on it.
+
+    client_factory is called on the loop thread and must return an async
+    chat-completions client such as AsyncAzureOpenAI.
+    """
+
+    def __init__(self, client_factory):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+        self.client = self.run(self._make_client(client_factory))
+
+    @staticmethod
+    async def _make_client(client_factory):
+        return client_factory()
+
+    def run(self, coroutine):
+        """
+        Runs a coroutine on the engine loop and waits for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def create(self, **kwargs):
+        """
+        Opens a streamed completion. Blocks until the response has started, so
+        API errors such as 429 are raised in the calling thread.
+        """
+        return self.run(self.client.chat.completions.create(stream=True, **kwargs))
+
+    def stream(self, stream, parser: StreamParser, budget=None) -> Generation:
+        """
+        Starts consuming a stream on the loop and returns its Generation handle.
+        """
+        generation = Generation(self, parser, budget)
+        generation._future = asyncio.run_coroutine_threadsafe(generation._run(stream), self.loop)
+        return generation
@@ -0,0 +1,169 @@
+"""
+Shared Azure OpenAI and Supabase clients.
+
+Streamlit reruns the whole script on every interaction. The clients are cached
+with st.cache_resource, so they and their HTTP connection pools are built once
+per process and reused by every session and rerun. openai, supabase and httpx
+are only imported when the first client is built, which keeps them off the
+start screen's cold start.
+"""
+import os
+from typing import TYPE_CHECKING
+
+import streamlit as st
+
+from admission import AdmissionController
+from async_engine import StreamingEngine
+from conversation_log import ConversationLog
+from persistence import ConversationWriter
+from response_cache import ResponseCache
+from session_store import create_store
+
+if TYPE_CHECKING:
+    import httpx
+    from supabase import Client
+
+AZURE_API_VERSION = "2024-12-01-preview"
+AZURE_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT", "https://hai5014-qwertz.openai.azure.com/")
+
+# Connection pool and retry settings, tunable through environment variables
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+
+# Azure quota shared by all sessions of the process
+AZURE_RPM_LIMIT = float(os.getenv("AZURE_RPM_LIMIT", "60"))
+AZURE_TPM_LIMIT = float(os.getenv("AZURE_TPM_LIMIT", "60000"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "50"))
+
+# Response cache size and lifetime
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "500"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+
+# Session store: "memory" or "sqlite:<path>" (a local file, shared by the processes of one host)
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+
+
+def _pool_options() -> dict:
+    import httpx
+
+    return {
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        "timeout": httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    }
+
+
+def build_http_client() -> "httpx.Client":
+    """
+    Creates a keep-alive httpx client with bounded pool size and timeouts.
+    """
+    import httpx
+
+    return httpx.Client(**_pool_options())
+
+
+@st.cache_resource(show_spinner=False)
+def get_streaming_engine(api_key: str) -> StreamingEngine:
+    """
+    Returns the process-wide asyncio streaming engine with its AsyncAzureOpenAI
+    client. Retries are left to the admission controller.
+    """
+    import httpx
+    from openai import AsyncAzureOpenAI
+
+    return StreamingEngine(lambda: AsyncAzureOpenAI(
+        api_version=AZURE_API_VERSION,
+        azure_endpoint=AZURE_ENDPOINT,
+        api_key=api_key,
+        max_retries=0,
+        http_client=httpx.AsyncClient(**_pool_options())
+    ))
+
+
+@st.cache_resource(show_spinner=False)
+def get_supabase_client(url: str, key: str) -> "Client":
+    """
+    Returns the process-wide Supabase client.
+    """
+    from supabase import create_client
+    from supabase.lib.client_options import ClientOptions
+
+    return create_client(url, key, options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT))
+
+
+@st.cache_resource(show_spinner=False)
+def get_conversation_writer(url: str, key: str) -> ConversationWriter:
+    """
+    Returns the process-wide background writer for finished conversations.
+    """
+    return ConversationWriter(get_supabase_client(url, key))
+
+
+@st.cache_resource(show_spinner=False)
+def get_conversation_log() -> ConversationLog:
+    """
+    Returns the process-wide local conversation log.
+    """
+    return ConversationLog()
+
+
+@st.cache_resource(show_spinner=False)
+def get_admission_controller() -> AdmissionController:
+    """
+    Returns the process-wide admission controller for chat completion requests.
+    """
+    return AdmissionController(
+        requests_per_minute=AZURE_RPM_LIMIT,
+        tokens_per_minute=AZURE_TPM_LIMIT,
+        max_queue_size=ADMISSION_QUEUE_SIZE,
+        max_retries=OPENAI_MAX_RETRIES
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache() -> ResponseCache:
+    """
+    Returns the process-wide response cache.
+    """
+    return ResponseCache(max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+
+
+@st.cache_resource(show_spinner=False)
+def get_session_store():
+    """
+    Returns the process-wide session store.
+    """
+    return create_store(SESSION_STORE)
+
+
+async def _list_models(client):
+    await client.models.list()
+
+
+def check_health(engine: StreamingEngine = None, supabase_client: "Client" = None) -> dict:
+    """
+    Runs a cheap request against Azure OpenAI (with the engine's client) and
+    Supabase and reports whether each succeeded.
+    """
+    status = {}
+    if engine is not None:
+        try:
+            engine.run(_list_models(engine.client.with_options(max_retries=0, timeout=HTTP_CONNECT_TIMEOUT)))
+            status["openai"] = True
+        except Exception:
+            status["openai"] = False
+    if supabase_client is not None:
+        try:
+            supabase_client.table("conversations").select("id").limit(1).execute()
+            status["supabase"] = True
+        except Exception:
+            status["supabase"] = False
+    return status
@@ -0,0 +1,139 @@
+"""
+Builds the prompt messages for each turn within a token budget.
+
+Earlier assistant turns are reduced to their answer (REASONING and Sources
+sections are dropped), only the most recent messages are sent verbatim and
+older turns are folded into a short summary. The builder reports how many
+prompt tokens this saved compared to sending the full history.
+"""
+from stream_parser import parse_response, ANSWER
+
+_ENCODING = None
+_ENCODING_LOADED = False
+
+# Default context settings
+WINDOW_MESSAGES = 6
+MAX_PROMPT_TOKENS = 2000
+SUMMARY_SNIPPET_CHARS = 160
+SUMMARY_MAX_MESSAGES = 20
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators added by the chat format
+
+
+def _get_encoding():
+    """
+    Loads the tiktoken encoding on first use; loading it takes a noticeable
+    part of the app's cold start.
+    """
+    global _ENCODING, _ENCODING_LOADED
+    if not _ENCODING_LOADED:
+        try:
+            import tiktoken
+            _ENCODING = tiktoken.get_encoding("o200k_base")
+        except Exception:  # tiktoken is optional
+            _ENCODING = None
+        _ENCODING_LOADED = True
+    return _ENCODING
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts tokens with tiktoken if installed, otherwise estimates 4 characters per token.
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def count_message_tokens(messages: list) -> int:
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def strip_sections(content: str, has_reasoning: bool = False, has_sources: bool = False) -> str:
+    """
+    Returns only the answer part of a structured assistant message.
+    """
+    if not (has_reasoning or has_sources):
+        return content
+    return parse_response(content, has_reasoning, has_sources)[ANSWER]
+
+
+def _snippet(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit].rstrip() + "..."
+
+
+def summarize(messages: list, limit: int = SUMMARY_SNIPPET_CHARS) -> str:
+    """
+    Short extractive summary of older turns, one line per message for the
+    SUMMARY_MAX_MESSAGES most recent ones.
+    """
+    lines = [f"{m['role']}: {_snippet(m['content'], limit)}" for m in messages[-SUMMARY_MAX_MESSAGES:]]
+    return "Summary of the earlier conversation:\n" + "\n".join(lines)
+
+
+class ContextBuilder:
+    """
+    Turns the chat history into the messages sent to the API.
+
+    window is the number of most recent messages sent verbatim, max_tokens the
+    prompt budget per request. summarizer can replace the default extractive
+    summary, e.g. with an LLM call.
+    """
+
+    def __init__(self, window: int = WINDOW_MESSAGES, max_tokens: int = MAX_PROMPT_TOKENS,
+                 has_reasoning: bool = False, has_sources: bool = False, summarizer=summarize):
+        self.window = window
+        self.max_tokens = max_tokens
+        self.has_reasoning = has_reasoning
+        self.has_sources = has_sources
+        self.summarizer = summarizer
+
+    def _compact(self, message: dict) -> dict:
+        content = message["content"]
+        if message["role"] == "assistant":
+            if message.get("sections"):
+                # Parsed once when the message was stored
+                content = message["sections"][ANSWER]
+            else:
+                content = strip_sections(content, self.has_reasoning, self.has_sources)
+        return {"role": message["role"], "content": content}
+
+    def build(self, system_prompt: str, messages: list):
+        """
+        Returns (api_messages, stats) for the given history.
+
+        stats holds the token count of the uncompacted prompt, the prompt that
+        is actually sent and the difference.
+        """
+        system = {"role": "system", "content": system_prompt}
+        history = [{"role": m["role"], "content": m["content"]} for m in messages]
+        full_tokens = count_message_tokens([system] + history)
+
+        compacted = [self._compact(m) for m in messages]
+        split = max(0, len(compacted) - self.window)
+        older, recent = compacted[:split], compacted[split:]
+
+        def assemble():
+            prompt = [system]
+            if older:
+                prompt.append({"role": "system", "content": self.summarizer(older)})
+            return prompt + recent
+
+        api_messages = assemble()
+        # Move messages into the summary until the budget is met, always keeping the latest one
+        while count_message_tokens(api_messages) > self.max_tokens and len(recent) > 1:
+            older.append(recent.pop(0))
+            api_messages = assemble()
+        # Drop the summary as a last resort
+        if count_message_tokens(api_messages) > self.max_tokens and older:
+            older = []
+            api_messages = assemble()
+
+        prompt_tokens = count_message_tokens(api_messages)
+        stats = {
+            "full_tokens": full_tokens,
+            "prompt_tokens": prompt_tokens,
+            "saved_tokens": full_tokens - prompt_tokens
+        }
+        return api_messages, stats
@@ -0,0 +1,228 @@
+"""
+Append-only local log of conversations.
+
+Records are appended as compact JSON lines to numbered segment files that are
+rotated at a size limit. Appends only fill an in-memory buffer; a background
+thread writes and fsyncs the buffer in batches, so many sessions share one
+fsync. An index file maps every record to its segment and byte offset for
+lookup by session ID.
+
+llm_app.py appends a "turn" record after every turn and an "end" record when
+the session ends, so a crashed session keeps its transcript up to the last
+batch. Tools such as export.py open the log read-only, so reading it while the
+app is running neither repairs nor appends to the files.
+"""
+import atexit
+import io
+import json
+import os
+import threading
+import time
+
+LOG_DIR = "conversations"
+SEGMENT_BYTES = 16 * 1024 * 1024
+FSYNC_INTERVAL = 1.0  # seconds between batched writes
+INDEX_FILE = "index.jsonl"
+
+
+def _segment_name(number: int) -> str:
+    return f"segment-{number:06d}.jsonl"
+
+
+def _dumps(record: dict) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class ConversationLog:
+    """
+    Rotating segment files with batched fsync and a session index.
+
+    A read_only log only indexes the files in memory: torn tails are skipped
+    instead of truncated, recovered entries are not written to the index and
+    append() is refused.
+    """
+
+    def __init__(self, directory: str = LOG_DIR, segment_bytes: int = SEGMENT_BYTES,
+                 fsync_interval: float = FSYNC_INTERVAL, read_only: bool = False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.read_only = read_only
+        self.stats = {"records": 0, "batches": 0, "rotations": 0}
+        self._index = {}
+        self._pending = []
+        self._pending_index = []
+        self._lock = threading.Lock()
+        # Serializes batches, so they reach the files in append order
+        self._write_lock = threading.Lock()
+        self._thread = None
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, _segment_name(number))
+
+    def _load_index(self):
+        """
+        Reads the index and indexes records that were written to a segment
+        but not to the index before a crash.
+        """
+        indexed_end = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Last line cut off by a crash
+                        continue
+                    self._add_to_index(entry)
+                    end = entry["offset"] + entry["length"]
+                    indexed_end[entry["segment"]] = max(indexed_end.get(entry["segment"], 0), end)
+
+        # A read-only log of a directory that was never written is empty
+        names = os.listdir(self.directory) if os.path.isdir(self.directory) else []
+        segments = sorted(int(name[8:14]) for name in names
+                          if name.startswith("segment-") and name.endswith(".jsonl"))
+        self._segment = segments[-1] if segments else 1
+        self._size = 0
+        recovered = []
+        for number in segments:
+            path = self._segment_path(number)
+            offset = indexed_end.get(number, 0)
+            with open(path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    entry = {"id": record["session_id"], "segment": number, "offset": offset, "length": len(line)}
+                    self._add_to_index(entry)
+                    recovered.append(entry)
+                    offset += len(line)
+            if self.read_only:
+                continue
+            if os.path.getsize(path) > offset:
+                # Drop a partially written record so new appends start on a clean line
+                with open(path, "r+b") as f:
+                    f.truncate(offset)
+            if number == self._segment:
+                self._size = offset
+        if recovered and not self.read_only:
+            self._pending_index.extend(recovered)
+            self._write_pending()
+
+    def _add_to_index(self, entry: dict):
+        self._index.setdefault(entry["id"], []).append((entry["segment"], entry["offset"], entry["length"]))
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def append(self, session_id: str, record_type: str, **fields):
+        """
+        Buffers one record of a session; it is written with the next batch.
+        """
+        if self.read_only:
+            raise io.UnsupportedOperation("The conversation log was opened read-only")
+        data = _dumps({"session_id": session_id, "type": record_type, **fields})
+        with self._lock:
+            self._start()
+            if self._size and self._size + len(data) > self.segment_bytes:
+                self._segment += 1
+                self._size = 0
+                self.stats["rotations"] += 1
+            entry = {"id": session_id, "segment": self._segment, "offset": self._size, "length": len(data)}
+            self._size += len(data)
+            self._pending.append((self._segment, data))
+            self._pending_index.append(entry)
+            self._add_to_index(entry)
+            self.stats["records"] += 1
+
+    def _write_pending(self):
+        """
+        Writes and fsyncs the buffered records, then their index entries.
+        Appends are not blocked while the batch is written.
+        """
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                pending_index, self._pending_index = self._pending_index, []
+            if pending:
+                by_segment = {}
+                for number, data in pending:
+                    by_segment.setdefault(number, []).append(data)
+                for number, chunks in by_segment.items():
+                    with open(self._segment_path(number), "ab") as f:
+                        f.write(b"".join(chunks))
+                        f.flush()
+                        os.fsync(f.fileno())
+                self.stats["batches"] += 1
+            if pending_index:
+                # The index is written after the records it points to
+                with open(self.index_path, "ab") as f:
+                    f.write(b"".join(_dumps(entry) for entry in pending_index))
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def _run(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            self._write_pending()
+
+    def flush(self):
+        """
+        Writes everything appended so far.
+        """
+        self._write_pending()
+
+    def read(self, session_id: str) -> list:
+        """
+        Returns the records of a session in the order they were appended.
+        """
+        self.flush()
+        with self._lock:
+            locations = list(self._index.get(session_id, []))
+        records = []
+        for number, offset, length in locations:
+            with open(self._segment_path(number), "rb") as f:
+                f.seek(offset)
+                records.append(json.loads(f.read(length)))
+        return records
+
+    def load(self, session_id: str):
+        """
+        Rebuilds a conversation from its records, in the row shape stored in
+        Supabase, or returns None for an unknown session.
+        """
+        records = self.read(session_id)
+        if not records:
+            return None
+        row = {"conversation_id": session_id, "conversation": [], "metrics": [], "ended": False}
+        for record in records:
+            row["conversation"].extend(record.get("messages", []))
+            row["metrics"].extend(record.get("metrics", []))
+            if record["type"] == "end":
+                row["ended"] = True
+        return row
+
+    def session_ids(self) -> list:
+        with self._lock:
+            return list(self._index)
+
+    def conversations(self):
+        """
+        Yields every logged conversation, one at a time.
+        """
+        for session_id in self.session_ids():
+            yield self.load(session_id)
@@ -0,0 +1,231 @@
+"""
+Streaming export of stored conversations into a flat per-turn table.
+
+Conversations are read from the Supabase table page by page (keyset
+pagination on the id column), session by session from the local
+conversation log, or file by file from a directory of conversation files or
+spool/ rows. Every assistant
+turn becomes one row with the condition, section lengths, timings and token
+counts. Rows are written as they are produced, so memory use does not grow
+with the number of conversations.
+
+Output formats by file extension: .jsonl.gz (gzip-compressed JSON lines),
+.jsonl, or .parquet (needs pyarrow, written in row groups).
+
+Usage:
+    python export.py turns.jsonl.gz
+    python export.py turns.parquet --source log --dir conversations
+"""
+import argparse
+import gzip
+import json
+import os
+
+from conversation_log import ConversationLog
+from persistence import TABLE_NAME, ID_COLUMN
+from stream_parser import ANSWER_MARKER, SOURCES_MARKER, parse_response
+
+PAGE_SIZE = 200
+ROW_GROUP_SIZE = 10000
+
+# Column name -> type of the exported table
+COLUMNS = {
+    "conversation_id": "string",
+    "turn": "int",
+    "condition": "string",
+    "truncated": "bool",
+    "user_chars": "int",
+    "reasoning_chars": "int",
+    "answer_chars": "int",
+    "sources_chars": "int",
+    "started_at": "float",
+    "ttft": "float",
+    "time_to_answer": "float",
+    "time_to_sources": "float",
+    "stream_time": "float",
+    "total_time": "float",
+    "chunks": "int",
+    "tokens_per_second": "float",
+    "prompt_tokens": "int",
+    "completion_tokens": "int",
+    "saved_prompt_tokens": "int",
+    "artificial_delay": "float",
+    "queue_wait": "float",
+    "cache_hit": "bool",
+    "cut_off": "string"
+}
+METRIC_COLUMNS = list(COLUMNS)[8:]
+
+
+def read_supabase(client, page_size: int = PAGE_SIZE, table: str = TABLE_NAME):
+    """
+    Yields the stored rows in id order, one page in memory at a time.
+    """
+    last_id = None
+    while True:
+        query = client.table(table).select(f"id,{ID_COLUMN},conversation,metrics").order("id").limit(page_size)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.execute().data
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+def read_local(directory: str):
+    """
+    Yields rows from a directory of conversation files (a list of messages) or
+    spooled rows (a dict with the conversation and its metrics).
+    """
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".json"):
+                continue
+            with open(entry.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, list):
+                data = {ID_COLUMN: os.path.splitext(entry.name)[0], "conversation": data}
+            yield data
+
+
+def _sections(message: dict) -> dict:
+    if "sections" in message:
+        return message["sections"]
+    # Files saved before the sections were stored
+    content = message["content"]
+    return parse_response(content, ANSWER_MARKER in content, SOURCES_MARKER in content)
+
+
+def turn_rows(row: dict):
+    """
+    Flattens one stored conversation into a row per assistant turn. Messages
+    are joined with their metrics on turn_id; conversations stored before turn
+    IDs were recorded are joined by position.
+    """
+    metrics = row.get("metrics") or []
+    metrics_by_id = {entry["turn_id"]: entry for entry in metrics if entry.get("turn_id")}
+    user_chars = None
+    turn = 0
+    for message in row.get("conversation") or []:
+        if message["role"] == "user":
+            user_chars = len(message["content"])
+            continue
+        if message["role"] != "assistant":
+            continue
+        sections = _sections(message)
+        if "turn_id" in message:
+            turn_metrics = metrics_by_id.get(message["turn_id"], {})
+        else:
+            turn_metrics = metrics[turn] if turn < len(metrics) else {}
+        record = {
+            "conversation_id": row.get(ID_COLUMN),
+            "turn": turn,
+            "condition": turn_metrics.get("condition"),
+            "truncated": bool(message.get("truncated")),
+            "user_chars": user_chars,
+            "reasoning_chars": len(sections.get("reasoning") or ""),
+            "answer_chars": len(sections.get("answer") or ""),
+            "sources_chars": len(sections.get("sources") or "")
+        }
+        for column in METRIC_COLUMNS:
+            record[column] = turn_metrics.get(column)
+        yield record
+        turn += 1
+        user_chars = None
+
+
+class JsonLinesSink:
+    def __init__(self, path: str):
+        opener = gzip.open if path.endswith(".gz") else open
+        self._file = opener(path, "wt", encoding="utf-8")
+
+    def write(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+    """
+    Buffers up to row_group_size rows and writes them as one row group.
+    """
+
+    def __init__(self, path: str, row_group_size: int = ROW_GROUP_SIZE):
+        import pyarrow as pa  # optional dependency, only needed for Parquet output
+        import pyarrow.parquet as pq
+
+        types = {"string": pa.string(), "int": pa.int64(), "float": pa.float64(), "bool": pa.bool_()}
+        self._pa = pa
+        self._schema = pa.schema([(name, types[kind]) for name, kind in COLUMNS.items()])
+        self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+        self._row_group_size = row_group_size
+        self._rows = []
+
+    def write(self, record: dict):
+        self._rows.append(record)
+        if len(self._rows) >= self._row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(self._pa.Table.from_pylist(self._rows, schema=self._schema))
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def open_sink(path: str):
+    if path.endswith(".parquet"):
+        return ParquetSink(path)
+    if path.endswith(".jsonl") or path.endswith(".jsonl.gz"):
+        return JsonLinesSink(path)
+    raise ValueError("Output must end in .jsonl.gz, .jsonl or .parquet")
+
+
+def export(rows, sink) -> tuple:
+    """
+    Writes the turns of all rows to the sink. Returns (conversations, turns).
+    """
+    conversations = turns = 0
+    for row in rows:
+        conversations += 1
+        for record in turn_rows(row):
+            sink.write(record)
+            turns += 1
+    return conversations, turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export stored conversations as a per-turn table")
+    parser.add_argument("output", help="file ending in .jsonl.gz, .jsonl or .parquet")
+    parser.add_argument("--source", choices=["supabase", "log", "local"], default="supabase")
+    parser.add_argument("--dir", default="conversations", help="directory for --source log or local")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    args = parser.parse_args()
+
+    if args.source == "supabase":
+        from dotenv import load_dotenv
+        from clients import get_supabase_client
+
+        load_dotenv()
+        client = get_supabase_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY"))
+        rows = read_supabase(client, args.page_size)
+    elif args.source == "log":
+        rows = ConversationLog(args.dir, read_only=True).conversations()
+    else:
+        rows = read_local(args.dir)
+
+    sink = open_sink(args.output)
+    try:
+        conversations, turns = export(rows, sink)
+    finally:
+        sink.close()
+    print(f"Exported {turns} turns of {conversations} conversations to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Aho-Corasick multi-pattern keyword matching.
+
+All keywords are compiled into one automaton, so an input is scanned once no
+matter how many keywords there are. When several keywords occur, the winner is
+chosen explicitly: highest priority first, then the longest keyword, then the
+keyword that was added first.
+"""
+from collections import deque
+
+
+class KeywordMatcher:
+    """
+    Maps keywords to values. Matching is case-insensitive.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._patterns = []
+        self._built = False
+
+    def add(self, keyword: str, value, priority: int = 0):
+        """
+        Adds a keyword. Call build() after the last keyword.
+        """
+        keyword = keyword.lower()
+        if not keyword:
+            raise ValueError("Keywords must not be empty")
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        # Rank: higher priority, then longer keyword, then earlier insertion
+        rank = (priority, len(keyword), -len(self._patterns))
+        self._patterns.append((keyword, value, rank))
+        self._output[state].append(len(self._patterns) - 1)
+        self._built = False
+
+    def build(self):
+        """
+        Computes the failure links (breadth-first over the keyword trie).
+        """
+        todo = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            todo.append(state)
+        while todo:
+            state = todo.popleft()
+            for char, next_state in self._goto[state].items():
+                todo.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+        self._built = True
+
+    def match(self, text: str, default=None):
+        """
+        Returns the value of the best-ranked keyword in text, or default.
+        """
+        if not self._built:
+            self.build()
+        best = None
+        state = 0
+        for char in text.lower():
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern in self._output[state]:
+                if best is None or self._patterns[pattern][2] > self._patterns[best][2]:
+                    best = pattern
+        return default if best is None else self._patterns[best][1]
+
+    def __len__(self):
+        return len(self._patterns)
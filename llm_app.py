@@ -2,101 +2,120 @@ import streamlit as st
 import time
 import os
 from dotenv import load_dotenv
-from openai import AzureOpenAI
-import json
-from datetime import datetime
 import secrets
-from supabase import create_client, Client
+from clients import (
+    get_streaming_engine, get_conversation_writer, get_conversation_log, get_admission_controller,
+    get_response_cache, get_session_store, get_supabase_client, check_health
+)
+from session_store import new_token, is_valid_token, snapshot
+from admission import QueueFullError
+from profiles import get_profile, SectionBudget
+from response_cache import replay_stream
+from stream_parser import StreamParser, parse_response, REASONING, ANSWER, SOURCES
+from stream_render import RenderScheduler
+from context_builder import ContextBuilder
+from metrics import TurnMetrics, REGISTRY, enable_token_trace
 
 load_dotenv()
 
 open_api_key = os.getenv("OPEN_AI_KEY")
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
-
 # Validate that API key is available
 if not open_api_key:
     st.error("❌ API key not found. Please check your environment variables.")
     st.stop()
-model_name = "gpt-4o-mini"
-
-client = AzureOpenAI(
-    api_version="2024-12-01-preview",
-    azure_endpoint="https://hai5014-qwertz.openai.azure.com/",
-    api_key=open_api_key
-)
-
-DEFAULT_SYSTEM_PROMPT = "You are a helpful AI mental-health assistant." 
 
 try:
     query_params = st.query_params
     condition = query_params.get("cond")
+    session_token = query_params.get("session")
 except AttributeError:
     query_params = st.experimental_get_query_params()
     condition = query_params.get("cond", [None])[0]
+    session_token = query_params.get("session", [None])[0]
 
 APP_TITLE = "Mental Health Assistant 💙"
 APP_CAPTION = "This assistant will help you with mental health-related queries."
-SYSTEM_PROMPT = DEFAULT_SYSTEM_PROMPT
 
-CONDITIONS_WITH_REASONING = ["A1", "A2"]
+# System prompt, model, sampling settings and token budgets of the condition (see profiles.py)
+profile = get_profile(condition)
+SYSTEM_PROMPT = profile["system_prompt"]
 
 BLOCK_INPUT_DURING_STREAMING = True
 
-# Configuration: Set to True to save conversations locally to files
+# Rendering of streamed tokens: placeholders are re-rendered at most RENDER_FPS times per second
+# or once RENDER_MIN_CHARS new characters are waiting
+RENDER_FPS = 10
+RENDER_MIN_CHARS = 200
+
+# Artificial typing speed in characters per second (None to show text as fast as it arrives)
+TYPING_SPEED = 80 if profile["has_reasoning"] else 130
+
+# "Processing..." pause in seconds shown between reasoning and answer, per condition.
+# The upstream stream keeps being read in the background during the pause.
+PROCESSING_DELAY = {"A1": 12.5, "A2": 12.5}
+
+# Prompt context: the last CONTEXT_WINDOW_MESSAGES messages are sent verbatim, older ones
+# are summarized, and the prompt is kept within MAX_PROMPT_TOKENS
+CONTEXT_WINDOW_MESSAGES = 6
+MAX_PROMPT_TOKENS = 2000
+
+# Response cache: set RESPONSE_CACHE_ENABLED to True to replay cached responses for repeated
+# prompts of the same condition; RESPONSE_CACHE_NEAR_DUPLICATES also matches similar prompts
+RESPONSE_CACHE_ENABLED = False
+RESPONSE_CACHE_NEAR_DUPLICATES = False
+
+# Set to True to show the per-condition latency summary at ?view=metrics and whether
+# Azure OpenAI and Supabase can be reached at ?view=health
+SHOW_METRICS_VIEW = False
+
+# Set to a file name (e.g. "token_trace.jsonl") to write the raw inter-token gaps of every turn there,
+# for replay pacing in artificial_stimuli.py; turn metrics only keep a histogram of them
+TOKEN_TRACE_FILE = None
+
+# Configuration: Set to True to also log conversations locally, turn by turn (see conversation_log.py)
 SAVE_CONVERSATIONS_LOCALLY = False
 
-if condition == "A1":
-    SYSTEM_PROMPT = (
-        "You are a helpful and professional AI mental-health assistant. Your response must be structured into two parts:\n"
-        "1. First, start with 'REASONING:' followed by your personal thought process. Write in first person as if you're "
-        "actually thinking through the problem (e.g., 'I need to help the user with...', 'Let me think about this...', "
-        "'I should consider...', 'But wait, I also need to address...'). Be conversational and personal in your reasoning. "
-        "But always talk about the users request and not as if were yours."
-        "Do NOT include any citations or sources in the reasoning section. Keep the reasoning brief to about 100 tokens.\n"
-        "2. Second, after a line break, start with 'ANSWER:' followed by the main answer.\n"
-        "Every statement of the main answer must include in-line citations formatted as **[Author et al., Year]** (in bold) for any factual claims or recommendations. "
-        "After your main answer, add a '### Sources:' section listing all references in this format: "
-        "Author, A. B., & Author, C. D. (Year). Title of study/article. Journal Name, Volume(Issue), pages. "
-        "Focus on providing general advice and support. Use short and concise bullet points. Use a maximum of 200 tokens."
-    )
-elif condition == "A2":
-    SYSTEM_PROMPT = (
-        "You are a helpful and professional AI mental-health assistant. Your response must be structured into two parts:\n"
-        "1. First, start with 'REASONING:' followed by your personal thought process. Write in first person as if you're "
-        "actually thinking through the problem (e.g., 'I need to help the user with...', 'Let me think about this...', "
-        "'I should consider...', 'But wait, I also need to address...'). Be conversational and personal in your reasoning."
-        "But always talk about the users request and not as if were yours."
-        "Do NOT include any citations or sources in the reasoning section. Keep the reasoning brief to about 100 tokens.\n"
-        "2. Second, after a line break, start with 'ANSWER:' followed by the main answer.\n"
-        "The main answer should NOT include any in-line citations or references to external sources."
-        "Focus on providing general advice and support. Use short can concise bullet points. Use a maximum of 150 tokens."
-    )
-elif condition == "A3":
-    SYSTEM_PROMPT = (
-        "You are a helpful and professional AI mental-health assistant. Provide a direct answer to the user's query. "
-        "Every statement of the main answer must include in-line citations formatted as **[Author et al., Year]** (in bold) for any factual claims or recommendations. "
-        "After your main answer, add a '### Sources:' section listing all references in this format: "
-        "Author, A. B., & Author, C. D. (Year). Title of study/article. Journal Name, Volume(Issue), pages. "
-        "Do not include any reasoning section. Strive for accuracy and clarity. Use a maximum of 200 tokens."
-    )
-elif condition == "A4":
-    SYSTEM_PROMPT = (
-        "You are a helpful and professional AI mental-health assistant. Provide a direct answer to the user's query. "
-        "The answer should NOT include any in-line citations or references to external sources. "
-        "Focus on providing general advice and support. Use a maximum of 150 tokens."
-    )
-else:
-    SYSTEM_PROMPT = DEFAULT_SYSTEM_PROMPT
+if TOKEN_TRACE_FILE:
+    enable_token_trace(TOKEN_TRACE_FILE)
 
 # Streamlit app configuration
 st.set_page_config(page_title=APP_TITLE, page_icon="💙")
 
+# METRICS VIEW
+if SHOW_METRICS_VIEW and query_params.get("view") in ("metrics", ["metrics"]):
+    st.json({
+        "turns": REGISTRY.summary(),
+        "admission": get_admission_controller().summary(),
+        "cache": get_response_cache().summary()
+    })
+    st.stop()
+
+# HEALTH VIEW
+if SHOW_METRICS_VIEW and query_params.get("view") in ("health", ["health"]):
+    st.json(check_health(get_streaming_engine(open_api_key), get_supabase_client(url, key)))
+    st.stop()
+
 # App title and caption based on condition
 st.title(APP_TITLE)
 st.caption(APP_CAPTION)
 
+# Chat state is written through to the session store and restored when a session with the
+# same ?session= token reconnects, e.g. after a reload or a restart (see session_store.py)
+session_store = get_session_store()
+if "session_token" not in st.session_state:
+    stored_state = session_store.get(session_token) if is_valid_token(session_token) else None
+    if stored_state is not None:
+        st.session_state.update(stored_state)
+    else:
+        session_token = new_token()
+        try:
+            st.query_params["session"] = session_token
+        except AttributeError:
+            st.experimental_set_query_params(**{**query_params, "session": session_token})
+    st.session_state.session_token = session_token
+
 # Initialize chat history
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -109,6 +128,23 @@ if "is_streaming" not in st.session_state:
 if "app_state" not in st.session_state:
     st.session_state.app_state = "start"  # start, chat, end
 
+# Token savings of the context builder, one entry per turn
+if "context_stats" not in st.session_state:
+    st.session_state.context_stats = []
+
+# Latency and token metrics, one entry per turn
+if "turn_metrics" not in st.session_state:
+    st.session_state.turn_metrics = []
+
+# Per-session conversation ID, used as idempotency key when saving
+if "conversation_id" not in st.session_state:
+    st.session_state.conversation_id = secrets.token_hex(16)
+
+# Number of messages and metrics already written to the local conversation log
+if "logged_messages" not in st.session_state:
+    st.session_state.logged_messages = 0
+    st.session_state.logged_metrics = 0
+
 # START SCREEN
 if st.session_state.app_state == "start":
     st.markdown("""
@@ -125,25 +161,39 @@ if st.session_state.app_state == "start":
     with col2:
         if st.button("🚀 Start Chat Session", type="primary", use_container_width=True):
             st.session_state.app_state = "chat"
+            session_store.put(st.session_state.session_token, snapshot(st.session_state))
             st.rerun()
     
     st.stop()
 
+# Clients are cached per process and shared by all sessions and reruns. They are built
+# after the start screen, so openai and supabase are not imported for its first paint
+conversation_writer = get_conversation_writer(url, key)
+# Generation runs on one event loop shared by all sessions (see async_engine.py)
+engine = get_streaming_engine(open_api_key)
+# Shared rate limiting and queueing of requests against the Azure quota
+admission = get_admission_controller()
+# Opt-in cache of complete responses, shared by all sessions
+response_cache = get_response_cache()
+# Append-only local log of the conversations
+conversation_log = get_conversation_log() if SAVE_CONVERSATIONS_LOCALLY else None
+
 # END SCREEN
-elif st.session_state.app_state == "end":
-    # Save conversation to file
-    if st.session_state.get("messages"):
-        # Save locally if enabled
+if st.session_state.app_state == "end":
+    # Save conversation once, the END screen reruns on every interaction
+    if st.session_state.get("messages") and not st.session_state.get("conversation_saved"):
+        # The turns are already in the local log, mark the session as finished
         if SAVE_CONVERSATIONS_LOCALLY:
-            os.makedirs("conversations", exist_ok=True)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            rand_suffix = secrets.token_hex(3)  # 6 hex digits
-            filename = f"conversations/conversation_{timestamp}_{rand_suffix}.json"
-            with open(filename, "w", encoding="utf-8") as f:
-                json.dump(st.session_state["messages"], f, ensure_ascii=False, indent=2)
+            conversation_log.append(st.session_state.conversation_id, "end", condition=condition)
         
-        # Save to Supabase
-        response = (supabase.table("conversations").insert({"conversation": st.session_state["messages"]}).execute())
+        # Save to Supabase in the background (upsert keyed by conversation ID)
+        conversation_writer.submit(
+            st.session_state.conversation_id,
+            st.session_state["messages"],
+            metrics=st.session_state.turn_metrics
+        )
+        st.session_state.conversation_saved = True
+        session_store.put(st.session_state.session_token, snapshot(st.session_state))
 
     st.markdown("""
     <div style="text-align: center; padding: 2rem 0;">
@@ -164,60 +214,40 @@ elif st.session_state.app_state == "end":
 # Display chat messages from history
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
-        if message["role"] == "assistant" and condition in CONDITIONS_WITH_REASONING:
-            # Check if the message contains reasoning structure
-            content = message["content"]
-            if "REASONING:" in content and "ANSWER:" in content:
-                parts = content.split("ANSWER:", 1)
-                reasoning_part = parts[0].replace("REASONING:", "").strip()
-                answer_part = parts[1].strip()
-                
-                # Check if sources section exists
-                if "### Sources:" in answer_part:
-                    answer_sections = answer_part.split("### Sources:", 1)
-                    main_answer = answer_sections[0].strip()
-                    sources_section = answer_sections[1].strip()
-                    
-                    # Display reasoning in an expander (collapsed for history)
-                    with st.expander("💭 Explanation", expanded=False):
-                        st.markdown(reasoning_part)
-                    
-                    # Display the main answer
-                    st.markdown(main_answer)
-                    
-                    # Display sources in an expander (collapsed for history)
-                    with st.expander("📚 Sources", expanded=False):
-                        st.markdown(sources_section)
-                else:
-                    # Display reasoning in an expander (collapsed for history)
-                    with st.expander("💭 Explanation", expanded=False):
-                        st.markdown(reasoning_part)
-                    
-                    # Display the main answer
-                    st.markdown(answer_part)
-            else:
-                # Fallback if no reasoning structure found
-                st.markdown(content)
-        elif message["role"] == "assistant" and condition in ["A3"]:
-            # Handle A3 condition (citations only, no reasoning)
-            content = message["content"]
-            if "### Sources:" in content:
-                content_sections = content.split("### Sources:", 1)
-                main_answer = content_sections[0].strip()
-                sources_section = content_sections[1].strip()
-                
-                # Display the main answer
-                st.markdown(main_answer)                # Display sources in an expander (collapsed for history)
+        if message["role"] == "assistant":
+            # Sections are parsed once when the message is stored
+            if "sections" not in message:
+                message["sections"] = parse_response(
+                    message["content"],
+                    has_reasoning=profile["has_reasoning"],
+                    has_sources=profile["has_sources"]
+                )
+            sections = message["sections"]
+            
+            if sections[REASONING] is not None:
+                # Display reasoning in an expander (collapsed for history)
+                with st.expander("💭 Explanation", expanded=False):
+                    st.markdown(sections[REASONING])
+            
+            # Display the main answer
+            st.markdown(sections[ANSWER])
+            
+            if sections[SOURCES] is not None:
+                # Display sources in an expander (collapsed for history)
                 with st.expander("📚 Sources", expanded=False):
-                    st.markdown(sources_section)
-            else:
-                st.markdown(content)        
+                    st.markdown(sections[SOURCES])
+            
+            if message.get("truncated"):
+                st.caption("⏹ Response stopped")
+        else:
+            st.markdown(message["content"])
 
 # Add End Chat button in sidebar
 with st.sidebar:
     st.markdown("---")
     if st.button("🔚 End Chat Session", type="secondary", use_container_width=True):
         st.session_state.app_state = "end"
+        session_store.put(st.session_state.session_token, snapshot(st.session_state))
         st.rerun()
 
 # Accept user input
@@ -231,194 +261,191 @@ if prompt := st.chat_input("How can I help you?", disabled=BLOCK_INPUT_DURING_ST
     # Display user message
     with st.chat_message("user"):
         st.markdown(prompt)    # Generate assistant response
+    # Clicking stop (or End Chat Session) reruns the script, which interrupts the
+    # stream below; the upstream connection is closed and the partial response is kept
+    st.sidebar.button("⏹ Stop generating", use_container_width=True)
+    
     with st.chat_message("assistant"):
+        generation = None
+        response_saved = False
+        # Links the assistant message to its metrics, which are recorded only once per turn
+        turn_id = secrets.token_hex(8)
+        turn_record = None
         try:
-            api_messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-            # Add existing user and assistant messages
-            api_messages.extend([{"role": m["role"], "content": m["content"]} for m in st.session_state.messages])
+            # Build the prompt from the compacted history within the token budget
+            context_builder = ContextBuilder(
+                window=CONTEXT_WINDOW_MESSAGES,
+                max_tokens=MAX_PROMPT_TOKENS,
+                has_reasoning=profile["has_reasoning"],
+                has_sources=profile["has_sources"]
+            )
+            api_messages, context_stats = context_builder.build(SYSTEM_PROMPT, st.session_state.messages)
+            st.session_state.context_stats.append(context_stats)
+            
+            metrics = TurnMetrics(condition)
+            metrics.extra["turn_id"] = turn_id
+            metrics.extra["saved_prompt_tokens"] = context_stats["saved_tokens"]
             
-            # Call the API with streaming
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=api_messages,
-                stream=True,
-                max_tokens=1000,
-                temperature=0.8
+            cached_response = None
+            if RESPONSE_CACHE_ENABLED:
+                cached_response = response_cache.get(
+                    condition, SYSTEM_PROMPT, api_messages, near_duplicates=RESPONSE_CACHE_NEAR_DUPLICATES
+                )
+            
+            # The parser tracks the REASONING / ANSWER / Sources sections incrementally
+            parser = StreamParser(
+                has_reasoning=profile["has_reasoning"],
+                has_sources=profile["has_sources"]
             )
+            # Each section is cut off once it exceeds its token budget
+            budget = SectionBudget(profile["section_budgets"])
             
-            # Initialize variables for parsing
-            full_response = ""
-            reasoning_complete = False
-            answer_started = False
-            sources_started = False
-            reasoning_placeholder = None
-            answer_placeholder = None
-            sources_placeholder = None
-            expander = None
-            sources_expander = None
-              # Check if this condition has reasoning
-            if condition in CONDITIONS_WITH_REASONING:
-                # Create the expander for reasoning upfront
-                expander = st.expander("💭 Explanation", expanded=True)
-                reasoning_placeholder = expander.empty()
-                answer_placeholder = st.empty()
-                
-                # Don't create sources expander yet - will create after streaming completes
-                sources_expander = None
-                sources_placeholder = None
+            if cached_response is not None:
+                # Replay the cached response through the normal streaming path. Only responses
+                # that were not cut off are cached, and replay chunks are not tokens, so the
+                # budget would cut off text that fit when it was generated
+                generation = engine.stream(replay_stream(cached_response), parser, budget=None)
+                metrics.extra["cache_hit"] = True
+            else:
+                # Wait for a slot within the shared quota, showing the position in the queue
+                queue_placeholder = st.empty()
                 
-                displayed_reasoning = ""
-                displayed_answer = ""
-                displayed_sources = ""
+                def show_queue_position(position, estimate):
+                    queue_placeholder.markdown(
+                        f"⏳ Many people are chatting right now. You are number {position} in line "
+                        f"(about {estimate:.0f} seconds)."
+                    )
                 
-                for chunk in response:
-                    if chunk.choices and chunk.choices[0].delta.content is not None:
-                        chunk_content = chunk.choices[0].delta.content
-                        full_response += chunk_content                        # Check if we've hit the Sources marker
-                        if "### Sources:" in full_response and not sources_started and condition == "A1":
-                            # Split at Sources marker
-                            parts = full_response.split("### Sources:", 1)
-                            pre_sources = parts[0]
-                            sources_part = parts[1]
-                            
-                            # Handle reasoning and answer sections
-                            if "ANSWER:" in pre_sources:
-                                answer_sections = pre_sources.split("ANSWER:", 1)
-                                reasoning_part = answer_sections[0].replace("REASONING:", "").strip()
-                                answer_part = answer_sections[1].strip()
-                                
-                                # Finalize reasoning and answer display
-                                reasoning_placeholder.markdown(reasoning_part)
-                                answer_placeholder.markdown(answer_part)
-                            
-                            # Create sources expander immediately when sources section starts
-                            sources_expander = st.expander("📚 Sources", expanded=False)
-                            sources_placeholder = sources_expander.empty()
-                            sources_started = True
-                            displayed_sources = sources_part
-                            # Display current sources content (even if incomplete)
-                            sources_placeholder.markdown(displayed_sources)
-                            
-                        elif sources_started and condition == "A1":
-                            # Continue collecting the sources and update display
-                            displayed_sources += chunk_content
-                            sources_placeholder.markdown(displayed_sources)
-                            
-                        # Check if we've hit the ANSWER: marker
-                        elif "ANSWER:" in full_response and not answer_started:
-                            # Split at ANSWER: marker
-                            parts = full_response.split("ANSWER:", 1)
-                            reasoning_part = parts[0].replace("REASONING:", "").strip()
-                            answer_part = parts[1]
-                            
-                            # Finalize reasoning display
-                            reasoning_placeholder.markdown(reasoning_part)
-                            reasoning_complete = True
-                            answer_started = True
-                            
-                            # Add thinking delay with loading indicator
-                            loading_placeholder = st.empty()
-                            loading_placeholder.markdown("**Processing...**")
-                            
-                            # Show loading for 5 seconds
-                            for i in range(50):  # 50 * 0.1 = 5 seconds
-                                loading_dots = "." * ((i % 3) + 1)
-                                loading_placeholder.markdown(f"**Processing{loading_dots}**")
-                                time.sleep(0.25)
-                            
-                            # Clear loading indicator
-                            loading_placeholder.empty()
-                            
-                            # Start displaying answer
-                            displayed_answer = answer_part
-                            answer_placeholder.markdown(displayed_answer + "▌")
-                            
-                        elif answer_started and not sources_started:
-                            # Continue streaming the answer
-                            displayed_answer += chunk_content
-                            answer_placeholder.markdown(displayed_answer + "▌")
-                            
-                        elif not reasoning_complete:
-                            # Still in reasoning phase
-                            if "REASONING:" in full_response:
-                                reasoning_text = full_response.replace("REASONING:", "").strip()
-                                reasoning_placeholder.markdown(reasoning_text + "▌")
+                # Open the stream on the shared event loop; connection errors, 429 and 5xx
+                # are retried by the admission layer
+                response, ticket = admission.call(
+                    lambda: engine.create(
+                        model=profile["model"],
+                        messages=api_messages,
+                        stream_options={"include_usage": True},
+                        max_tokens=profile["max_tokens"],
+                        temperature=profile["temperature"],
+                        stop=profile["stop"]
+                    ),
+                    tokens=context_stats["prompt_tokens"] + profile["max_tokens"],
+                    on_wait=show_queue_position
+                )
+                # The engine reads and parses the stream on its loop and publishes section events
+                generation = engine.stream(response, parser, budget)
+                queue_placeholder.empty()
+                metrics.extra["queue_wait"] = ticket.wait_time
+            
+            renderer = RenderScheduler(fps=RENDER_FPS, min_chars=RENDER_MIN_CHARS, typing_speed=TYPING_SPEED)
+            
+            if parser.has_reasoning:
+                # Create the expander for reasoning upfront
+                expander = st.expander("💭 Explanation", expanded=True)
+                renderer.attach(REASONING, expander.empty())
+            renderer.attach(ANSWER, st.empty())
+            
+            # Consume the section events at our own pace, the engine keeps reading meanwhile
+            for section, text in generation:
+                if not text:
+                    # A new section has started
+                    if section == ANSWER and parser.has_reasoning:
+                        # Finalize reasoning display
+                        renderer.finish_section(REASONING)
                         
-                        time.sleep(0.05)                # Remove final cursors
-                if sources_started and condition == "A1":
-                    # Sources expander already created, just remove cursor from final display
-                    sources_placeholder.markdown(displayed_sources)
-                elif answer_started:
-                    answer_placeholder.markdown(displayed_answer)
-                elif reasoning_placeholder:
-                    reasoning_text = full_response.replace("REASONING:", "").strip()
-                    reasoning_placeholder.markdown(reasoning_text)
-                    
-            elif condition == "A3":
-                # For A3 condition (citations only, no reasoning)
-                answer_placeholder = st.empty()
-                # Don't create sources expander yet - will create after streaming completes
-                sources_expander = None
-                sources_placeholder = None
-                
-                displayed_answer = ""
-                displayed_sources = ""
-                sources_started = False
-                
-                for chunk in response:
-                    if chunk.choices and chunk.choices[0].delta.content is not None:
-                        chunk_content = chunk.choices[0].delta.content
-                        full_response += chunk_content                        # Check if we've hit the Sources marker
-                        if "### Sources:" in full_response and not sources_started:
-                            # Split at Sources marker
-                            parts = full_response.split("### Sources:", 1)
-                            answer_part = parts[0].strip()
-                            sources_part = parts[1]
-                            
-                            # Finalize answer display
-                            answer_placeholder.markdown(answer_part)
-                            
-                            # Create sources expander immediately when sources section starts
-                            sources_expander = st.expander("📚 Sources", expanded=False)
-                            sources_placeholder = sources_expander.empty()
-                            sources_started = True
-                            displayed_sources = sources_part
-                            # Display current sources content (even if incomplete)
-                            sources_placeholder.markdown(displayed_sources)
-                            
-                        elif sources_started:
-                            # Continue collecting the sources and update display
-                            displayed_sources += chunk_content
-                            sources_placeholder.markdown(displayed_sources)
+                        # Add thinking delay with loading indicator
+                        loading_placeholder = st.empty()
+                        loading_placeholder.markdown("**Processing...**")
                         
-                        else:
-                            # Continue streaming the answer
-                            displayed_answer += chunk_content
-                            answer_placeholder.markdown(displayed_answer + "▌")
+                        # Show loading for the configured delay, the answer is buffered meanwhile
+                        deadline = time.monotonic() + PROCESSING_DELAY.get(condition, 0)
+                        i = 0
+                        while time.monotonic() < deadline:
+                            loading_dots = "." * ((i % 3) + 1)
+                            loading_placeholder.markdown(f"**Processing{loading_dots}**")
+                            time.sleep(max(0, min(0.25, deadline - time.monotonic())))
+                            i += 1
+                        metrics.add_delay(PROCESSING_DELAY.get(condition, 0))
                         
-                        time.sleep(0.03)                # Remove final cursors
-                if sources_started:
-                    # Sources expander already created, just remove cursor from final display
-                    sources_placeholder.markdown(displayed_sources)
-                else:
-                    answer_placeholder.markdown(displayed_answer)
-                    
-            else:
-                # For conditions without reasoning or citations, stream normally
-                response_placeholder = st.empty()
+                        # Clear loading indicator
+                        loading_placeholder.empty()
+                        
+                        # Release the answer buffered during the pause at once, so the pause does not
+                        # also delay its typing; text arriving later is typed at TYPING_SPEED
+                        renderer.push(ANSWER, generation.take_buffered(ANSWER))
+                        renderer.reveal(ANSWER)
+                    elif section == SOURCES:
+                        # Finalize reasoning and answer display
+                        renderer.finish_section(REASONING)
+                        renderer.finish_section(ANSWER)
+                        
+                        # Create sources expander immediately when sources section starts
+                        sources_expander = st.expander("📚 Sources", expanded=False)
+                        renderer.attach(SOURCES, sources_expander.empty(), cursor=False)
+                    continue
                 
-                for chunk in response:
-                    if chunk.choices and chunk.choices[0].delta.content is not None:
-                        full_response += chunk.choices[0].delta.content
-                        response_placeholder.markdown(full_response + "▌")
-                        time.sleep(0.03)
-                  # Remove final cursor
-                response_placeholder.markdown(full_response)
-            # Add assistant response to chat history
-            st.session_state.messages.append({"role": "assistant", "content": full_response})
+                # Queue the text; the scheduler decides when to re-render
+                renderer.push(section, text)
+            
+            # Final flush, removes the cursors
+            renderer.finish()
+            
+            metrics.add_generation(generation)
+            metrics.add_delay(renderer.sleep_time)
+            metrics.mark("end")
+            turn_record = REGISTRY.record(metrics)
+            st.session_state.turn_metrics.append(turn_record)
             
+            full_response = parser.full_response
+            if RESPONSE_CACHE_ENABLED and cached_response is None and generation.cut_off is None:
+                response_cache.put(condition, SYSTEM_PROMPT, api_messages, full_response)
+            
+            # Add assistant response to chat history, with its parsed sections for redisplay
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": full_response,
+                "sections": parser.result(),
+                "turn_id": turn_id
+            })
+            response_saved = True
+            
+        except QueueFullError:
+            st.error("The assistant is very busy right now. Please try again in a moment.")
         except Exception as e:
-            st.error(f"An error occurred: {e}")
+            if admission.is_retryable(e):
+                st.error("The assistant is very busy right now. Please try again in a moment.")
+            else:
+                st.error(f"An error occurred: {e}")
         finally:
+            # Cancel the generation right away if it was stopped or failed; the loop closes the stream
+            if generation is not None:
+                generation.close()
+                generation.done.wait(timeout=1)
+            if generation is not None and not response_saved and parser.full_response:
+                # Keep the partial response, flagged as truncated
+                parser.finish()
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": parser.full_response,
+                    "sections": parser.result(),
+                    "truncated": True,
+                    "turn_id": turn_id
+                })
+                if turn_record is None:
+                    metrics.add_generation(generation)
+                    metrics.extra["truncated"] = True
+                    metrics.mark("end")
+                    turn_record = REGISTRY.record(metrics)
+                    st.session_state.turn_metrics.append(turn_record)
+            # Log the new messages of this turn, so a crashed session keeps its transcript
+            if SAVE_CONVERSATIONS_LOCALLY:
+                conversation_log.append(
+                    st.session_state.conversation_id,
+                    "turn",
+                    messages=st.session_state.messages[st.session_state.logged_messages:],
+                    metrics=st.session_state.turn_metrics[st.session_state.logged_metrics:]
+                )
+                st.session_state.logged_messages = len(st.session_state.messages)
+                st.session_state.logged_metrics = len(st.session_state.turn_metrics)
             # Reset streaming state
             st.session_state.is_streaming = False
+            # Write the turn through to the session store
+            session_store.put(st.session_state.session_token, snapshot(st.session_state))
@@ -0,0 +1,110 @@
+"""
+End-to-end load test of llm_app.py against the local mock server.
+
+Each simulated session runs the app with Streamlit's AppTest: start screen ->
+several chat turns -> END screen. Sessions run concurrently in a thread pool
+and the harness reports turn latency percentiles, throughput and CPU / memory
+per session. No network access is needed.
+
+Usage:
+    python load_test.py --sessions 20 --turns 3 --cond A4
+"""
+import argparse
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_llm_server import create_server
+
+PROMPTS = [
+    "How can I help a friend who feels hopeless?",
+    "I have trouble sleeping because I worry a lot.",
+    "What can I do when I feel overwhelmed at work?",
+    "How do I talk to my family about my anxiety?"
+]
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_session(condition: str, turns: int, timeout: float) -> dict:
+    """
+    Drives one session through start -> turns -> end and returns its turn latencies.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file("llm_app.py", default_timeout=timeout)
+    app.query_params["cond"] = condition
+    app.run()
+    app.button[0].click().run()
+
+    latencies = []
+    errors = 0
+    for turn in range(turns):
+        start = time.perf_counter()
+        app.chat_input[0].set_value(PROMPTS[turn % len(PROMPTS)]).run()
+        latencies.append(time.perf_counter() - start)
+        if app.error:
+            errors += 1
+
+    app.sidebar.button[0].click().run()
+    return {"latencies": latencies, "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test llm_app.py against the mock server")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=None, help="defaults to --sessions")
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--cond", default="A4")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--ttft", type=float, default=0.5)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--chunk-size", type=int, default=4)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    server = create_server(port=args.port, ttft=args.ttft, token_latency=args.token_latency,
+                           chunk_size=args.chunk_size, error_rate=args.error_rate, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    endpoint = f"http://127.0.0.1:{args.port}"
+    os.environ["AZURE_OPENAI_ENDPOINT"] = endpoint + "/"
+    os.environ["SUPABASE_URL"] = endpoint
+    os.environ.setdefault("SUPABASE_KEY", "mock-key")
+    os.environ.setdefault("OPEN_AI_KEY", "mock-key")
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency or args.sessions) as pool:
+        futures = [pool.submit(run_session, args.cond, args.turns, args.timeout) for _ in range(args.sessions)]
+        results = [f.result() for f in futures]
+    wall_time = time.perf_counter() - start
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+
+    latencies = [latency for result in results for latency in result["latencies"]]
+    errors = sum(result["errors"] for result in results)
+    cpu_time = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss_mb = usage_after.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+    print(f"Condition {args.cond}: {args.sessions} sessions x {args.turns} turns in {wall_time:.1f}s")
+    print(f"Turn latency  p50 {percentile(latencies, 0.5):.3f}s  p95 {percentile(latencies, 0.95):.3f}s  "
+          f"p99 {percentile(latencies, 0.99):.3f}s  mean {statistics.mean(latencies):.3f}s")
+    print(f"Throughput    {len(latencies) / wall_time:.2f} turns/s")
+    print(f"CPU           {cpu_time / args.sessions:.3f}s per session")
+    print(f"Memory        {peak_rss_mb:.1f} MB peak RSS, {peak_rss_mb / args.sessions:.1f} MB per session")
+    print(f"Errors        {errors} turns with errors, {server.RequestHandlerClass.state.requests} API requests")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
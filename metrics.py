@@ -0,0 +1,205 @@
+"""
+Latency and throughput metrics for every LLM turn.
+
+Each turn records its timings (time to first token, time to the ANSWER and
+Sources markers, total stream time), chunk count, token usage, a histogram of
+the inter-token gaps and the time spent in artificial delays. Finished turns
+are written as one JSON line to the "health_chatbot.metrics" logger and kept
+in a process-wide registry that aggregates them per condition. The raw gaps
+are only written to the opt-in token trace (enable_token_trace), which
+pacing.py can replay.
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger("health_chatbot.metrics")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+# Raw inter-token gaps of every turn, only written once enable_token_trace() has been called
+trace_logger = logging.getLogger("health_chatbot.token_trace")
+trace_logger.propagate = False
+
+RECENT_TURNS = 500
+# Upper bounds in seconds of the inter-token gap histogram; the last bucket is open
+GAP_BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0)
+
+
+def _percentile(values: list, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def gap_histogram(gaps: list) -> dict:
+    """
+    Compact summary of a turn's inter-token gaps: bucket counts and a few percentiles.
+    """
+    counts = [0] * (len(GAP_BUCKETS) + 1)
+    for gap in gaps:
+        counts[bisect.bisect_left(GAP_BUCKETS, gap)] += 1
+    return {
+        "bounds": list(GAP_BUCKETS),
+        "counts": counts,
+        "p50": round(_percentile(gaps, 0.5), 4),
+        "p95": round(_percentile(gaps, 0.95), 4),
+        "max": round(max(gaps), 4)
+    }
+
+
+def enable_token_trace(path: str):
+    """
+    Appends the raw inter-token gaps of every recorded turn to path as JSON
+    lines, e.g. as a PACING_TRACE_FILE for artificial_stimuli.py.
+    """
+    if not trace_logger.handlers:
+        handler = logging.FileHandler(path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_logger.addHandler(handler)
+        trace_logger.setLevel(logging.INFO)
+
+
+class TurnMetrics:
+    """
+    Collects the measurements of a single turn. All times are seconds
+    relative to the start of the request.
+    """
+
+    def __init__(self, condition: str, clock=time.monotonic):
+        self.clock = clock
+        self.condition = condition
+        self.started_at = time.time()
+        self._start = clock()
+        self.marks = {}
+        self.chunks = 0
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.artificial_delay = 0.0
+        self.network_time = None
+        self.token_gaps = []
+        self.extra = {}
+
+    def elapsed(self) -> float:
+        return self.clock() - self._start
+
+    def mark(self, name: str, timestamp: float = None):
+        """
+        Records the first time an event happens, e.g. "first_token" or "answer".
+        timestamp is a reading of the metrics clock, defaulting to now.
+        """
+        if name not in self.marks:
+            self.marks[name] = self.elapsed() if timestamp is None else timestamp - self._start
+
+    def set_network_end(self, timestamp: float):
+        """
+        Sets the time the upstream stream was fully read, given on the metrics clock.
+        """
+        self.network_time = timestamp - self._start
+
+    def set_usage(self, usage):
+        """
+        Takes the usage reported on the last chunk with stream_options include_usage.
+        """
+        self.prompt_tokens = usage.prompt_tokens
+        self.completion_tokens = usage.completion_tokens
+
+    def add_generation(self, generation):
+        """
+        Takes the chunk count, timestamps and usage recorded by the streaming engine.
+        """
+        self.chunks = generation.chunks
+        if generation.first_token_at is not None:
+            self.mark("first_token", generation.first_token_at)
+        for section, timestamp in generation.section_started_at.items():
+            # Read-side times, so the consumer's delays and typing speed are not included
+            self.mark(section, timestamp)
+        if generation.usage is not None:
+            self.set_usage(generation.usage)
+        if generation.token_gaps:
+            # Only the histogram goes into the turn record, the raw gaps into the token trace
+            self.token_gaps = generation.token_gaps
+            self.extra["token_gaps"] = gap_histogram(generation.token_gaps)
+        if generation.cut_off is not None:
+            self.extra["cut_off"] = generation.cut_off
+        self.set_network_end(generation.finished_at or self.clock())
+
+    def add_delay(self, seconds: float):
+        self.artificial_delay += seconds
+
+    def to_dict(self) -> dict:
+        total = self.marks.get("end", self.elapsed())
+        first_token = self.marks.get("first_token")
+        tokens = self.completion_tokens if self.completion_tokens is not None else self.chunks
+        generation_time = (self.network_time or total) - (first_token or 0)
+        return {
+            "condition": self.condition,
+            "started_at": self.started_at,
+            "ttft": first_token,
+            "time_to_answer": self.marks.get("answer"),
+            "time_to_sources": self.marks.get("sources"),
+            "stream_time": self.network_time,
+            "total_time": total,
+            "chunks": self.chunks,
+            "tokens_per_second": tokens / generation_time if generation_time > 0 else None,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "artificial_delay": self.artificial_delay,
+            **self.extra
+        }
+
+
+class MetricsRegistry:
+    """
+    Keeps the most recent turns of the process and aggregates them per condition.
+    """
+
+    def __init__(self, size: int = RECENT_TURNS):
+        self._turns = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, turn: TurnMetrics) -> dict:
+        data = turn.to_dict()
+        with self._lock:
+            self._turns.append(data)
+        logger.info(json.dumps(data))
+        if trace_logger.handlers and turn.token_gaps:
+            trace_logger.info(json.dumps({
+                "condition": data["condition"],
+                "ttft": data["ttft"],
+                "inter_token_gaps": [round(gap, 4) for gap in turn.token_gaps]
+            }))
+        return data
+
+    def recent(self) -> list:
+        with self._lock:
+            return list(self._turns)
+
+    def summary(self) -> dict:
+        """
+        Turn count and p50 / p95 of the main timings per condition.
+        """
+        by_condition = {}
+        for data in self.recent():
+            by_condition.setdefault(data["condition"] or "none", []).append(data)
+        summary = {}
+        for condition, turns in by_condition.items():
+            entry = {"turns": len(turns)}
+            for field in ("ttft", "time_to_answer", "stream_time", "total_time",
+                          "tokens_per_second", "artificial_delay"):
+                values = [t[field] for t in turns if t.get(field) is not None]
+                entry[field] = {"p50": _percentile(values, 0.5), "p95": _percentile(values, 0.95)}
+            summary[condition] = entry
+        return summary
+
+
+# Process-wide registry shared by all sessions
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,218 @@
+"""
+Local stand-in for the Azure OpenAI chat-completions API and the Supabase REST API.
+
+The server streams responses shaped like the A1-A4 conditions (REASONING /
+ANSWER / Sources, depending on what the system prompt asks for) with
+configurable chunk size, time to first token, inter-token latency and error
+injection. Conversation inserts and upserts are accepted and kept in memory.
+
+Usage:
+    python mock_llm_server.py --port 8600 --ttft 0.5 --token-latency 0.02
+
+Point the app at it with
+    AZURE_OPENAI_ENDPOINT=http://localhost:8600/ SUPABASE_URL=http://localhost:8600
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+REASONING_TEXT = (
+    "I need to help the user with their question. Let me think about what matters most here: "
+    "they are looking for practical support, so I should be warm, validate their feelings and "
+    "suggest concrete next steps without diagnosing anything."
+)
+ANSWER_TEXT = (
+    "- Acknowledge how you feel and give yourself time to rest {cite}\n"
+    "- Talk to someone you trust about what is going on {cite}\n"
+    "- Keep a simple routine with sleep, meals and some movement {cite}\n"
+    "- If things feel overwhelming, reach out to a professional or a helpline {cite}"
+)
+CITATION = "**[Smith et al., 2020]**"
+SOURCES_TEXT = (
+    "Smith, A. B., & Jones, C. D. (2020). Everyday strategies for emotional wellbeing. "
+    "Journal of Mental Health, 12(3), 45-67."
+)
+
+
+def build_response(system_prompt: str) -> str:
+    """
+    Builds a response in the structure the system prompt asks for.
+    """
+    with_reasoning = "REASONING:" in system_prompt
+    with_sources = "### Sources:" in system_prompt
+    answer = ANSWER_TEXT.format(cite=CITATION if with_sources else "").replace(" \n", "\n").rstrip()
+    text = ""
+    if with_reasoning:
+        text += f"REASONING: {REASONING_TEXT}\n\nANSWER: "
+    text += answer
+    if with_sources:
+        text += f"\n\n### Sources:\n{SOURCES_TEXT}"
+    return text
+
+
+def split_chunks(text: str, size: int) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class MockState:
+    def __init__(self, args):
+        self.args = args
+        self.rows = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, format, *args):
+        if not self.state.args.quiet:
+            super().log_message(format, *args)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def _send_json(self, status: int, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        # Azure clients add ?api-version=..., Supabase adds its filters to the query string
+        path = urlsplit(self.path).path
+        if path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}]})
+        elif path.startswith("/rest/v1/"):
+            self._send_json(200, [])
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        body = self._read_json()
+        path = urlsplit(self.path).path
+        if path.startswith("/rest/v1/"):
+            self._store_rows(body)
+        elif path.rstrip("/").endswith("/chat/completions"):
+            self._chat_completion(body)
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def _store_rows(self, body):
+        rows = body if isinstance(body, list) else [body]
+        with self.state.lock:
+            for row in rows:
+                key = row.get("conversation_id") or f"row-{len(self.state.rows)}"
+                self.state.rows[key] = row
+        self._send_json(201, rows)
+
+    def _chat_completion(self, body):
+        args = self.state.args
+        with self.state.lock:
+            self.state.requests += 1
+        if random.random() < args.error_rate:
+            self._send_json(args.error_status, {"error": {"code": str(args.error_status), "message": "Injected error"}})
+            return
+
+        messages = body.get("messages", [])
+        system_prompt = "".join(m["content"] for m in messages if m["role"] == "system")
+        text = build_response(system_prompt)
+        stop = body.get("stop") or []
+        for sequence in [stop] if isinstance(stop, str) else stop:
+            # Like the real API, end the response before the first stop sequence
+            if sequence in text:
+                text = text[:text.index(sequence)]
+        chunks = split_chunks(text, args.chunk_size)
+        created = int(time.time())
+
+        def event(delta=None, finish_reason=None, usage=None):
+            payload = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model", "gpt-4o-mini"),
+                "choices": [] if usage else [{"index": 0, "delta": delta or {}, "finish_reason": finish_reason}]
+            }
+            if usage:
+                payload["usage"] = usage
+            return f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+
+        if not body.get("stream"):
+            self._send_json(200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": created,
+                "model": body.get("model", "gpt-4o-mini"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(system_prompt) // 4, "completion_tokens": len(chunks),
+                          "total_tokens": len(system_prompt) // 4 + len(chunks)}
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            time.sleep(args.ttft)
+            self.wfile.write(event({"role": "assistant", "content": ""}))
+            abort_at = len(chunks) // 2 if random.random() < args.abort_rate else None
+            for i, chunk in enumerate(chunks):
+                if i == abort_at:
+                    # Simulate a dropped upstream connection
+                    return
+                self.wfile.write(event({"content": chunk}))
+                self.wfile.flush()
+                time.sleep(args.token_latency)
+            self.wfile.write(event(finish_reason="stop"))
+            if (body.get("stream_options") or {}).get("include_usage"):
+                prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+                self.wfile.write(event(usage={"prompt_tokens": prompt_tokens, "completion_tokens": len(chunks),
+                                              "total_tokens": prompt_tokens + len(chunks)}))
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the stream
+            pass
+
+
+def create_server(host: str = "127.0.0.1", port: int = 8600, **options) -> ThreadingHTTPServer:
+    """
+    Creates the mock server; options override the command line defaults.
+    """
+    args = build_arg_parser().parse_args([])
+    for name, value in options.items():
+        setattr(args, name, value)
+    handler = type("Handler", (MockHandler,), {"state": MockState(args)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Mock chat-completions and Supabase server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--chunk-size", type=int, default=4, help="characters per streamed chunk")
+    parser.add_argument("--ttft", type=float, default=0.5, help="seconds before the first chunk")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="seconds between chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--abort-rate", type=float, default=0.0, help="share of streams cut off halfway")
+    parser.add_argument("--quiet", action="store_true")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
+    options = {k: v for k, v in vars(args).items() if k not in ("host", "port")}
+    server = create_server(args.host, args.port, **options)
+    print(f"Mock server listening on http://{args.host}:{args.port}/")
+    server.serve_forever()
@@ -0,0 +1,138 @@
+"""
+Deterministic pacing of streamed canned responses.
+
+A Pacer turns a sequence of chunks into a schedule of delays:
+
+- "cps" / "tps": a fixed rate in characters or tokens (about 4 characters) per
+  second, optionally jittered by inter-token gaps recorded from real runs;
+- "replay": time to first token and inter-token gaps are drawn from the
+  distributions recorded by llm_app.py's turn metrics.
+
+The random draws are seeded, so the same seed and chunks always give the same
+timing. stream() feeds Streamlit's st.write_stream: it sleeps in the script
+thread, once per frame instead of once per chunk, and pauses such as the one
+between reasoning and output are part of the schedule (lead).
+"""
+import itertools
+import json
+import random
+import time
+
+CHARS_PER_TOKEN = 4
+DEFAULT_FRAME_INTERVAL = 0.1
+
+
+def _histogram_gaps(histogram: dict) -> list:
+    """
+    Representative gaps of a gap histogram: the middle of each bucket, as often
+    as it was counted; the open last bucket stands for the largest gap.
+    """
+    bounds = histogram["bounds"]
+    gaps = []
+    for i, count in enumerate(histogram["counts"]):
+        if i == len(bounds):
+            gap = histogram["max"]
+        else:
+            gap = ((bounds[i - 1] if i else 0.0) + bounds[i]) / 2
+        gaps.extend([gap] * count)
+    return gaps
+
+
+def load_trace(path: str) -> dict:
+    """
+    Reads recorded turns (JSON lines as written by the token trace or the
+    metrics logger, or a JSON list of them) and returns their TTFTs and
+    inter-token gaps. Turns from the metrics logger only have a gap histogram,
+    which is expanded into representative gaps.
+    """
+    with open(path, encoding="utf-8") as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        turns = json.loads(content)
+    else:
+        turns = [json.loads(line) for line in content.splitlines() if line.strip().startswith("{")]
+    trace = {"ttft": [], "gaps": []}
+    for turn in turns:
+        if turn.get("ttft") is not None:
+            trace["ttft"].append(turn["ttft"])
+        if turn.get("inter_token_gaps"):
+            trace["gaps"].extend(turn["inter_token_gaps"])
+        elif turn.get("token_gaps"):
+            trace["gaps"].extend(_histogram_gaps(turn["token_gaps"]))
+    return trace
+
+
+class Pacer:
+    """
+    Computes the delay before each chunk of a response.
+
+    rate is in characters (mode "cps") or tokens (mode "tps") per second.
+    ttft is the delay before the first chunk; in replay mode it is drawn from
+    the trace instead.
+    """
+
+    def __init__(self, mode: str = "cps", rate: float = 60.0, ttft: float = 0.0,
+                 trace: dict = None, seed=None):
+        if mode not in ("cps", "tps", "replay"):
+            raise ValueError(f"Unknown pacing mode '{mode}'")
+        if mode == "replay" and not (trace and trace["gaps"]):
+            raise ValueError("Replay pacing needs a trace with inter-token gaps")
+        self.mode = mode
+        self.rate = rate
+        self.ttft = ttft
+        self.trace = trace
+        self.seed = seed
+        # Jitter factors keep the shape of the recorded gaps around a mean of 1
+        self._jitter = None
+        if trace and trace["gaps"]:
+            mean_gap = sum(trace["gaps"]) / len(trace["gaps"])
+            if mean_gap > 0:
+                self._jitter = [gap / mean_gap for gap in trace["gaps"]]
+
+    def delays(self, chunks, seed=None, first: bool = True, lead: float = 0.0) -> list:
+        """
+        Delay in seconds before each chunk. If first, the TTFT is added to the
+        first delay; lead is a fixed pause added before the first chunk.
+        """
+        rng = random.Random(f"{self.seed}:{seed}")
+        delays = []
+        for chunk in chunks:
+            if self.mode == "replay":
+                delay = rng.choice(self.trace["gaps"])
+            else:
+                units = len(chunk) if self.mode == "cps" else len(chunk) / CHARS_PER_TOKEN
+                delay = units / self.rate
+                if self._jitter:
+                    delay *= rng.choice(self._jitter)
+            delays.append(delay)
+        if first and delays:
+            if self.mode == "replay" and self.trace["ttft"]:
+                delays[0] += rng.choice(self.trace["ttft"])
+            else:
+                delays[0] += self.ttft
+        if delays:
+            delays[0] += lead
+        return delays
+
+    def stream(self, chunks, seed=None, first: bool = True, lead: float = 0.0,
+               frame_interval: float = DEFAULT_FRAME_INTERVAL, clock=time.monotonic, sleep=time.sleep):
+        """
+        Yields the chunks on schedule. Chunks that fall due within the same frame
+        are joined, so the thread wakes up at most once per frame_interval.
+        """
+        chunks = list(chunks)
+        due = list(itertools.accumulate(self.delays(chunks, seed, first, lead)))
+        start = clock()
+        last = -frame_interval
+        i = 0
+        while i < len(chunks):
+            now = clock() - start
+            wake = max(due[i], last + frame_interval)
+            if wake > now:
+                sleep(wake - now)
+                now = clock() - start
+            j = i + 1
+            while j < len(chunks) and due[j] <= now:
+                j += 1
+            yield "".join(chunks[i:j])
+            i, last = j, now
@@ -0,0 +1,166 @@
+"""
+Write-behind persistence of finished conversations.
+
+The END screen only enqueues the conversation; a background writer batches the
+rows of all sessions and upserts them into Supabase keyed by the per-session
+conversation ID, so reruns of the END screen never insert duplicates. Rows that
+cannot be written are spooled to disk and retried later, and rows still queued
+when the process exits are spooled as well.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+TABLE_NAME = "conversations"
+ID_COLUMN = "conversation_id"
+
+# Writer settings
+BATCH_SIZE = 20
+BATCH_LINGER = 0.5  # seconds to wait for more rows before writing a batch
+SPOOL_DIR = "spool"
+SPOOL_RETRY_INTERVAL = 30
+
+logger = logging.getLogger("health_chatbot.persistence")
+
+
+class ConversationWriter:
+    """
+    Background queue that upserts conversation rows in batches.
+
+    client is anything with the Supabase query interface
+    (client.table(name).upsert(rows, on_conflict=...).execute()), so a local
+    stand-in can be used instead of Supabase.
+    """
+
+    def __init__(self, client, table: str = TABLE_NAME, batch_size: int = BATCH_SIZE,
+                 linger: float = BATCH_LINGER, spool_dir: str = SPOOL_DIR,
+                 retry_interval: float = SPOOL_RETRY_INTERVAL):
+        self.client = client
+        self.table = table
+        self.batch_size = batch_size
+        self.linger = linger
+        self.spool_dir = spool_dir
+        self.retry_interval = retry_interval
+        self.stats = {"written": 0, "batches": 0, "spooled": 0, "recovered": 0, "quarantined": 0}
+        self._queue = queue.Queue()
+        self._last_retry = 0.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.spool_pending)
+
+    def submit(self, conversation_id: str, messages: list, **fields):
+        """
+        Enqueues a conversation. Submitting the same ID again overwrites the row.
+        """
+        row = {ID_COLUMN: conversation_id, "conversation": messages}
+        row.update(fields)
+        self._queue.put(row)
+
+    def _next_batch(self):
+        try:
+            rows = [self._queue.get(timeout=self.linger)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger
+        while len(rows) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return rows
+
+    def spool_pending(self) -> int:
+        """
+        Spools the rows that are still queued, e.g. at exit when there is no
+        time left to reach Supabase. Returns how many rows were spooled.
+        """
+        count = 0
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                return count
+            try:
+                self._spool(row)
+                count += 1
+            except OSError:
+                logger.exception("Could not spool conversation %s", row.get(ID_COLUMN))
+
+    def _run(self):
+        # Errors are logged per iteration, the writer thread must outlive them
+        while True:
+            rows = self._next_batch()
+            if rows:
+                try:
+                    self._write(rows)
+                except Exception:
+                    logger.exception("Could not write or spool %d conversations", len(rows))
+            if time.monotonic() - self._last_retry >= self.retry_interval:
+                self._last_retry = time.monotonic()
+                try:
+                    self.retry_spool()
+                except Exception:
+                    logger.exception("Could not retry the spooled conversations")
+
+    def _upsert(self, rows: list):
+        self.client.table(self.table).upsert(rows, on_conflict=ID_COLUMN).execute()
+
+    def _write(self, rows: list):
+        # Only the latest row per conversation ID is kept within a batch
+        unique = {row[ID_COLUMN]: row for row in rows}
+        rows = list(unique.values())
+        try:
+            self._upsert(rows)
+            self.stats["written"] += len(rows)
+            self.stats["batches"] += 1
+        except Exception:
+            for row in rows:
+                self._spool(row)
+
+    def _spool(self, row: dict):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f"{row[ID_COLUMN]}.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(row, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.stats["spooled"] += 1
+
+    def retry_spool(self):
+        """
+        Tries to write the spooled rows again and removes the ones that succeed.
+        """
+        if not os.path.isdir(self.spool_dir):
+            return
+        paths = [os.path.join(self.spool_dir, name) for name in sorted(os.listdir(self.spool_dir))
+                 if name.endswith(".json")]
+        for start in range(0, len(paths), self.batch_size):
+            batch = paths[start:start + self.batch_size]
+            rows = []
+            for path in batch[:]:
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        rows.append(json.load(f))
+                except ValueError:
+                    # Corrupt, e.g. cut off by a full disk; set aside so it is not retried forever
+                    logger.warning("Quarantining unreadable spool file %s", path)
+                    os.replace(path, path + ".bad")
+                    batch.remove(path)
+                    self.stats["quarantined"] += 1
+            if not rows:
+                continue
+            try:
+                self._upsert(rows)
+            except Exception:
+                # Supabase is still unavailable, try again on the next interval
+                return
+            for path in batch:
+                os.remove(path)
+            self.stats["recovered"] += len(rows)
@@ -0,0 +1,239 @@
+"""
+Batch pre-generation of study stimuli.
+
+Generates a response for every prompt of a prompt set and every condition
+(A1-A4) against the chat-completions API, with the system prompt and settings
+of the condition's generation profile. Requests run in a bounded thread pool
+and pass through an AdmissionController for the rate limits. Every valid
+response is appended to a checkpoint file, so an interrupted run continues
+where it stopped. Responses must have the REASONING / ANSWER / Sources
+structure of their condition; invalid ones are regenerated.
+
+For each condition a stimulus file in the format of stimuli.py is written, so
+it can be loaded by artificial_stimuli.py (set STIMULI_FILE).
+
+The prompt set is a JSON list of {"id", "prompt", "keywords", "priority"}
+objects, or a text file with one prompt per line.
+
+Usage:
+    python pregenerate.py prompts.json --conditions A1,A2,A3,A4 --workers 8
+    python pregenerate.py prompts.json --endpoint http://localhost:8600/  # against mock_llm_server.py
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import AzureOpenAI
+
+from admission import AdmissionController
+from clients import AZURE_API_VERSION, AZURE_ENDPOINT, build_http_client
+from context_builder import count_message_tokens
+from profiles import PROFILES, get_profile
+from stream_parser import SOURCES_MARKER, parse_response
+
+DEFAULT_OUTPUT = "stimuli_{condition}.json"
+DEFAULT_CHECKPOINT = "pregenerate_checkpoint.jsonl"
+
+
+def load_prompts(path: str) -> list:
+    """
+    Reads a prompt set; plain text lines get ids "prompt-1", "prompt-2", ...
+    """
+    with open(path, encoding="utf-8") as f:
+        if os.path.splitext(path)[1].lower() == ".json":
+            prompts = json.load(f)
+        else:
+            lines = [line.strip() for line in f if line.strip()]
+            prompts = [{"id": f"prompt-{i}", "prompt": line} for i, line in enumerate(lines, 1)]
+    ids = [p["id"] for p in prompts]
+    if len(set(ids)) != len(ids):
+        raise ValueError("Prompt ids must be unique")
+    return prompts
+
+
+def validate(content: str, profile: dict):
+    """
+    Parses a response and checks it has the sections of its condition.
+    Returns (sections, problem); problem is None for a valid response.
+    """
+    sections = parse_response(content, profile["has_reasoning"], profile["has_sources"])
+    if profile["has_reasoning"] and not sections["reasoning"]:
+        return sections, "missing REASONING / ANSWER sections"
+    if not sections["answer"]:
+        return sections, "empty answer"
+    if profile["has_sources"] and not sections["sources"]:
+        return sections, "missing Sources section"
+    if not profile["has_sources"] and SOURCES_MARKER in sections["answer"]:
+        return sections, "unexpected Sources section"
+    return sections, None
+
+
+def to_stimulus(sections: dict) -> dict:
+    """
+    Reasoning and displayed output of a stimulus; sources are appended to the output.
+    """
+    output = sections["answer"]
+    if sections["sources"]:
+        output += f"\n\n{SOURCES_MARKER}\n{sections['sources']}"
+    return {"reasoning": sections["reasoning"] or "", "output": output}
+
+
+class Checkpoint:
+    """
+    Append-only JSON lines file of finished (condition, id) results.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.results = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut off by an interrupted run
+                        continue
+                    self.results[(record["condition"], record["id"])] = record
+
+    def __contains__(self, key) -> bool:
+        return key in self.results
+
+    def add(self, record: dict):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            self.results[(record["condition"], record["id"])] = record
+
+
+class Generator:
+    """
+    Generates and validates the response of one prompt for one condition.
+    """
+
+    def __init__(self, client, admission: AdmissionController, checkpoint: Checkpoint, attempts: int = 3):
+        self.client = client
+        self.admission = admission
+        self.checkpoint = checkpoint
+        self.attempts = attempts
+
+    def generate(self, condition: str, prompt: dict) -> str:
+        """
+        Returns None on success, or the reason the prompt failed.
+        """
+        profile = get_profile(condition)
+        messages = [
+            {"role": "system", "content": profile["system_prompt"]},
+            {"role": "user", "content": prompt["prompt"]}
+        ]
+        tokens = count_message_tokens(messages) + profile["max_tokens"]
+        problem = None
+        for _ in range(self.attempts):
+            try:
+                response, _ = self.admission.call(lambda: self.client.chat.completions.create(
+                    model=profile["model"],
+                    messages=messages,
+                    temperature=profile["temperature"],
+                    max_tokens=profile["max_tokens"],
+                    stop=profile["stop"]
+                ), tokens)
+            except Exception as e:
+                return f"{type(e).__name__}: {e}"
+            sections, problem = validate(response.choices[0].message.content or "", profile)
+            if problem is None:
+                self.checkpoint.add({"condition": condition, "id": prompt["id"], **to_stimulus(sections)})
+                return None
+        return problem
+
+
+def write_stimuli(path: str, condition: str, prompts: list, checkpoint: Checkpoint, default: str):
+    responses = []
+    for prompt in prompts:
+        record = checkpoint.results[(condition, prompt["id"])]
+        responses.append({
+            "id": prompt["id"],
+            "keywords": prompt.get("keywords", []),
+            "priority": prompt.get("priority", 0),
+            "reasoning": record["reasoning"],
+            "output": record["output"]
+        })
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"default": default, "responses": responses}, f, indent=2, ensure_ascii=False)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Pre-generate study stimuli for the A1-A4 conditions")
+    parser.add_argument("prompts", help="JSON prompt set or text file with one prompt per line")
+    parser.add_argument("--conditions", default="A1,A2,A3,A4")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="stimulus file, {condition} is replaced")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--default", default=None, help="id of the fallback response, defaults to the first prompt")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=60, help="requests per minute")
+    parser.add_argument("--tpm", type=float, default=60000, help="tokens per minute")
+    parser.add_argument("--attempts", type=int, default=3, help="generations per prompt until it is valid")
+    parser.add_argument("--max-retries", type=int, default=3, help="retries of 429 / 5xx responses")
+    parser.add_argument("--endpoint", default=AZURE_ENDPOINT)
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    conditions = [c.strip() for c in args.conditions.split(",") if c.strip()]
+    unknown = [c for c in conditions if c not in PROFILES]
+    if unknown:
+        sys.exit(f"Unknown conditions: {', '.join(unknown)}")
+    api_key = os.getenv("OPEN_AI_KEY")
+    if not api_key:
+        sys.exit("OPEN_AI_KEY is not set")
+
+    prompts = load_prompts(args.prompts)
+    default = args.default or prompts[0]["id"]
+    if default not in {p["id"] for p in prompts}:
+        sys.exit(f"Default response '{default}' is not in the prompt set")
+
+    client = AzureOpenAI(
+        api_version=AZURE_API_VERSION,
+        azure_endpoint=args.endpoint,
+        api_key=api_key,
+        max_retries=0,
+        http_client=build_http_client()
+    )
+    jobs = [(c, p) for c in conditions for p in prompts]
+    checkpoint = Checkpoint(args.checkpoint)
+    pending = [(c, p) for c, p in jobs if (c, p["id"]) not in checkpoint]
+    admission = AdmissionController(requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                                    max_queue_size=max(1, len(pending)), max_retries=args.max_retries)
+    generator = Generator(client, admission, checkpoint, attempts=args.attempts)
+    print(f"{len(jobs) - len(pending)} of {len(jobs)} responses already in {args.checkpoint}")
+
+    failures = []
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(generator.generate, c, p): (c, p["id"]) for c, p in pending}
+        for done, future in enumerate(futures, 1):
+            problem = future.result()
+            condition, prompt_id = futures[future]
+            status = "ok" if problem is None else f"failed ({problem})"
+            print(f"[{done}/{len(pending)}] {condition} {prompt_id}: {status}")
+            if problem is not None:
+                failures.append((condition, prompt_id, problem))
+
+    for condition in conditions:
+        if any(c == condition for c, _, _ in failures):
+            print(f"{condition}: incomplete, rerun to retry the failed prompts")
+            continue
+        path = args.output.format(condition=condition)
+        write_stimuli(path, condition, prompts, checkpoint, default)
+        print(f"{condition}: wrote {len(prompts)} responses to {path}")
+    stats = admission.summary()
+    print(f"Requests: {stats['admitted']} admitted, {stats['retries']} retried")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Declarative generation profiles for the study conditions.
+
+Each condition defines its system prompt, model, sampling settings, stop
+sequences and a token budget per response section. max_tokens is derived from
+the section budgets, and the stream reader cuts a section off once it exceeds
+its budget, which bounds the worst-case latency and cost of every turn.
+"""
+from stream_parser import REASONING, ANSWER, SOURCES
+
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_TEMPERATURE = 0.8
+DEFAULT_SYSTEM_PROMPT = "You are a helpful AI mental-health assistant."
+
+A1_SYSTEM_PROMPT = (
+    "You are a helpful and professional AI mental-health assistant. Your response must be structured into two parts:\n"
+    "1. First, start with 'REASONING:' followed by your personal thought process. Write in first person as if you're "
+    "actually thinking through the problem (e.g., 'I need to help the user with...', 'Let me think about this...', "
+    "'I should consider...', 'But wait, I also need to address...'). Be conversational and personal in your reasoning. "
+    "But always talk about the users request and not as if were yours."
+    "Do NOT include any citations or sources in the reasoning section. Keep the reasoning brief to about 100 tokens.\n"
+    "2. Second, after a line break, start with 'ANSWER:' followed by the main answer.\n"
+    "Every statement of the main answer must include in-line citations formatted as **[Author et al., Year]** (in bold) for any factual claims or recommendations. "
+    "After your main answer, add a '### Sources:' section listing all references in this format: "
+    "Author, A. B., & Author, C. D. (Year). Title of study/article. Journal Name, Volume(Issue), pages. "
+    "Focus on providing general advice and support. Use short and concise bullet points. Use a maximum of 200 tokens."
+)
+
+A2_SYSTEM_PROMPT = (
+    "You are a helpful and professional AI mental-health assistant. Your response must be structured into two parts:\n"
+    "1. First, start with 'REASONING:' followed by your personal thought process. Write in first person as if you're "
+    "actually thinking through the problem (e.g., 'I need to help the user with...', 'Let me think about this...', "
+    "'I should consider...', 'But wait, I also need to address...'). Be conversational and personal in your reasoning."
+    "But always talk about the users request and not as if were yours."
+    "Do NOT include any citations or sources in the reasoning section. Keep the reasoning brief to about 100 tokens.\n"
+    "2. Second, after a line break, start with 'ANSWER:' followed by the main answer.\n"
+    "The main answer should NOT include any in-line citations or references to external sources."
+    "Focus on providing general advice and support. Use short can concise bullet points. Use a maximum of 150 tokens."
+)
+
+A3_SYSTEM_PROMPT = (
+    "You are a helpful and professional AI mental-health assistant. Provide a direct answer to the user's query. "
+    "Every statement of the main answer must include in-line citations formatted as **[Author et al., Year]** (in bold) for any factual claims or recommendations. "
+    "After your main answer, add a '### Sources:' section listing all references in this format: "
+    "Author, A. B., & Author, C. D. (Year). Title of study/article. Journal Name, Volume(Issue), pages. "
+    "Do not include any reasoning section. Strive for accuracy and clarity. Use a maximum of 200 tokens."
+)
+
+A4_SYSTEM_PROMPT = (
+    "You are a helpful and professional AI mental-health assistant. Provide a direct answer to the user's query. "
+    "The answer should NOT include any in-line citations or references to external sources. "
+    "Focus on providing general advice and support. Use a maximum of 150 tokens."
+)
+
+# Section budgets are in completion tokens (roughly one streamed chunk each) and leave
+# headroom over the lengths the prompts ask for.
+PROFILES = {
+    "A1": {
+        "system_prompt": A1_SYSTEM_PROMPT,
+        "model": DEFAULT_MODEL,
+        "temperature": DEFAULT_TEMPERATURE,
+        "stop": None,
+        "section_budgets": {REASONING: 160, ANSWER: 320, SOURCES: 300}
+    },
+    "A2": {
+        "system_prompt": A2_SYSTEM_PROMPT,
+        "model": DEFAULT_MODEL,
+        "temperature": DEFAULT_TEMPERATURE,
+        # Sources are never shown in A2
+        "stop": ["### Sources:"],
+        "section_budgets": {REASONING: 160, ANSWER: 240}
+    },
+    "A3": {
+        "system_prompt": A3_SYSTEM_PROMPT,
+        "model": DEFAULT_MODEL,
+        "temperature": DEFAULT_TEMPERATURE,
+        "stop": None,
+        "section_budgets": {ANSWER: 320, SOURCES: 300}
+    },
+    "A4": {
+        "system_prompt": A4_SYSTEM_PROMPT,
+        "model": DEFAULT_MODEL,
+        "temperature": DEFAULT_TEMPERATURE,
+        "stop": ["### Sources:"],
+        "section_budgets": {ANSWER: 240}
+    }
+}
+
+DEFAULT_PROFILE = {
+    "system_prompt": DEFAULT_SYSTEM_PROMPT,
+    "model": DEFAULT_MODEL,
+    "temperature": DEFAULT_TEMPERATURE,
+    "stop": None,
+    "section_budgets": {ANSWER: 1000}
+}
+
+
+def get_profile(condition: str) -> dict:
+    """
+    Returns the profile of a condition with its derived settings filled in.
+    Unknown or missing conditions get the default profile.
+    """
+    profile = dict(PROFILES.get(condition, DEFAULT_PROFILE))
+    budgets = profile["section_budgets"]
+    profile["has_reasoning"] = REASONING in budgets
+    profile["has_sources"] = SOURCES in budgets
+    profile["max_tokens"] = sum(budgets.values())
+    return profile
+
+
+class SectionBudget:
+    """
+    Counts streamed tokens per section against the profile budgets.
+    """
+
+    def __init__(self, budgets: dict):
+        self.budgets = budgets
+        self.counts = {}
+
+    def consume(self, section: str, tokens: int = 1) -> bool:
+        """
+        Adds tokens to a section and returns False once it is over budget.
+        """
+        self.counts[section] = self.counts.get(section, 0) + tokens
+        return self.counts[section] <= self.budgets.get(section, float("inf"))
@@ -0,0 +1,171 @@
+"""
+Opt-in cache of complete responses for repeated and near-duplicate prompts.
+
+Entries are keyed by condition, system prompt and the normalized conversation
+prefix. Besides exact matches, a first turn (a prefix of a single user
+message) can fall back to the most similar cached first turn of the same
+condition and system prompt (cosine similarity of character trigram counts,
+computed locally). Later turns only ever match exactly: in a longer prefix the
+earlier answers dominate the similarity, so a very different new message
+could still match. Entries expire after a TTL and the least recently used
+ones are evicted beyond the size cap.
+"""
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from types import SimpleNamespace
+
+# Default cache settings
+MAX_ENTRIES = 500
+TTL_SECONDS = 24 * 60 * 60
+SIMILARITY_THRESHOLD = 0.9
+NGRAM_SIZE = 3
+
+_NON_WORD = re.compile(r"[^\w\s]")
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercases, drops punctuation and collapses whitespace.
+    """
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+def normalize_messages(messages: list) -> str:
+    """
+    Normalized conversation prefix of the non-system messages.
+    """
+    return "\n".join(f"{m['role']}: {normalize(m['content'])}" for m in messages if m["role"] != "system")
+
+
+def first_user_message(messages: list):
+    """
+    The normalized message of a first turn, or None if the prefix has earlier turns.
+    """
+    turns = [m for m in messages if m["role"] != "system"]
+    if len(turns) == 1 and turns[0]["role"] == "user":
+        return normalize(turns[0]["content"])
+    return None
+
+
+def _ngrams(text: str, size: int = NGRAM_SIZE) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i:i + size] for i in range(max(1, len(padded) - size + 1)))
+
+
+def _cosine(a: Counter, a_norm: float, b: Counter, b_norm: float) -> float:
+    if not a_norm or not b_norm:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(count * b.get(gram, 0) for gram, count in a.items()) / (a_norm * b_norm)
+
+
+class _Entry:
+    def __init__(self, group: str, first_message, response: str):
+        self.group = group
+        self.response = response
+        self.created = time.monotonic()
+        # Only first turns take part in near-duplicate lookups
+        self.vector = _ngrams(first_message) if first_message is not None else None
+        self.norm = math.sqrt(sum(c * c for c in self.vector.values())) if self.vector else 0.0
+
+
+class ResponseCache:
+    """
+    LRU / TTL cache of responses with exact and near-duplicate lookup.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL_SECONDS,
+                 near_duplicates: bool = False, threshold: float = SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.near_duplicates = near_duplicates
+        self.threshold = threshold
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _group(condition: str, system_prompt: str) -> str:
+        return hashlib.sha256(f"{condition}\0{system_prompt}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _key(group: str, prefix: str) -> str:
+        return hashlib.sha256(f"{group}\0{prefix}".encode("utf-8")).hexdigest()
+
+    def _expired(self, entry: _Entry) -> bool:
+        return time.monotonic() - entry.created > self.ttl
+
+    def get(self, condition: str, system_prompt: str, messages: list, near_duplicates: bool = None):
+        """
+        Returns the cached response for the conversation prefix, or None.
+        near_duplicates overrides the cache default for this lookup; it only
+        applies to first turns.
+        """
+        if near_duplicates is None:
+            near_duplicates = self.near_duplicates
+        group = self._group(condition, system_prompt)
+        prefix = normalize_messages(messages)
+        key = self._key(group, prefix)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry.response
+
+            first_message = first_user_message(messages) if near_duplicates else None
+            if first_message is not None:
+                vector = _ngrams(first_message)
+                norm = math.sqrt(sum(c * c for c in vector.values()))
+                best_key, best_score = None, self.threshold
+                for candidate_key, candidate in self._entries.items():
+                    if candidate.group != group or candidate.vector is None or self._expired(candidate):
+                        continue
+                    score = _cosine(vector, norm, candidate.vector, candidate.norm)
+                    if score >= best_score:
+                        best_key, best_score = candidate_key, score
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.stats["near_hits"] += 1
+                    return self._entries[best_key].response
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, condition: str, system_prompt: str, messages: list, response: str):
+        """
+        Stores a complete response for the conversation prefix.
+        """
+        group = self._group(condition, system_prompt)
+        prefix = normalize_messages(messages)
+        key = self._key(group, prefix)
+        with self._lock:
+            self._entries[key] = _Entry(group, first_user_message(messages), response)
+            self._entries.move_to_end(key)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def summary(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["near_hits"] + self.stats["misses"]
+        hits = self.stats["hits"] + self.stats["near_hits"]
+        return {**self.stats, "entries": len(self._entries), "hit_rate": hits / lookups if lookups else None}
+
+
+def replay_stream(text: str, chunk_size: int = 4):
+    """
+    Yields a cached response as chat-completion-like chunks, so a cache hit
+    goes through the same streaming and rendering path as a live response.
+    """
+    for i in range(0, len(text), chunk_size):
+        delta = SimpleNamespace(content=text[i:i + chunk_size])
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
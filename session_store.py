@@ -0,0 +1,181 @@
+"""
+Session state that outlives a Streamlit session.
+
+st.session_state only lives in the process that holds the websocket. The chat
+state is written through to a SessionStore after every change and restored
+when a session with the same token (the "session" URL parameter) reconnects,
+e.g. after a page reload, a dropped websocket or a restart of the app.
+
+Backends:
+- MemorySessionStore: per process, bounded by an LRU limit;
+- SQLiteSessionStore: a SQLite file, which survives restarts and can be shared
+  by the app processes of one host. SQLite's locking (and WAL's shared memory)
+  does not work across hosts, so it must not be put on a network file system
+  for replicas on several machines; those need a networked store.
+
+Both drop sessions that have been idle for longer than the TTL.
+"""
+import json
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Default store settings
+MAX_SESSIONS = 1000
+IDLE_TTL = 24 * 60 * 60
+EXPIRE_INTERVAL = 60
+
+# Session state keys that are persisted
+PERSISTED_KEYS = (
+    "messages", "app_state", "context_stats", "turn_metrics", "conversation_id", "conversation_saved",
+    "logged_messages", "logged_metrics"
+)
+
+_TOKEN_PATTERN = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+def new_token() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def is_valid_token(token) -> bool:
+    return isinstance(token, str) and bool(_TOKEN_PATTERN.match(token))
+
+
+def snapshot(session_state) -> dict:
+    """
+    The persisted part of a session state. is_streaming is not persisted: a
+    restored session is never in the middle of a response.
+    """
+    return {key: session_state[key] for key in PERSISTED_KEYS if key in session_state}
+
+
+class MemorySessionStore:
+    """
+    In-process store, keeps the most recently used max_sessions sessions.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_ttl: float = IDLE_TTL,
+                 expire_interval: float = EXPIRE_INTERVAL, clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.expire_interval = expire_interval
+        self.clock = clock
+        self._last_expire = clock()
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None:
+                return None
+            if self.clock() - entry[0] > self.idle_ttl:
+                del self._sessions[token]
+                return None
+            self._sessions.move_to_end(token)
+            return json.loads(entry[1])
+
+    def put(self, token: str, state: dict):
+        # Stored serialized, so the caller's later changes do not leak into the store
+        data = json.dumps(state, ensure_ascii=False)
+        with self._lock:
+            self._sessions[token] = (self.clock(), data)
+            self._sessions.move_to_end(token)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        if self.clock() - self._last_expire > self.expire_interval:
+            self.expire()
+
+    def delete(self, token: str):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def expire(self) -> int:
+        """
+        Drops idle sessions and returns how many were dropped.
+        """
+        now = self.clock()
+        self._last_expire = now
+        with self._lock:
+            idle = [token for token, (updated, _) in self._sessions.items() if now - updated > self.idle_ttl]
+            for token in idle:
+                del self._sessions[token]
+        return len(idle)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """
+    Store in a SQLite file. Sessions live on disk, so process memory does not
+    grow with their number; idle sessions are deleted periodically.
+    """
+
+    def __init__(self, path: str, idle_ttl: float = IDLE_TTL, expire_interval: float = EXPIRE_INTERVAL,
+                 clock=time.time):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.expire_interval = expire_interval
+        self.clock = clock
+        self._last_expire = 0.0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        # WAL lets processes on this host read while another one writes; it needs
+        # a local file system, see the module docstring
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (token TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, token: str):
+        with self._lock:
+            row = self._db.execute("SELECT state, updated FROM sessions WHERE token = ?", (token,)).fetchone()
+        if row is None or self.clock() - row[1] > self.idle_ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, token: str, state: dict):
+        data = json.dumps(state, ensure_ascii=False)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sessions (token, state, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(token) DO UPDATE SET state = excluded.state, updated = excluded.updated",
+                (token, data, self.clock())
+            )
+            self._db.commit()
+        if self.clock() - self._last_expire > self.expire_interval:
+            self.expire()
+
+    def delete(self, token: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE token = ?", (token,))
+            self._db.commit()
+
+    def expire(self) -> int:
+        now = self.clock()
+        self._last_expire = now
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM sessions WHERE updated < ?", (now - self.idle_ttl,))
+            self._db.commit()
+        return cursor.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def create_store(spec: str):
+    """
+    Creates a store from a spec: "memory" or "sqlite:<path>".
+    """
+    if spec == "memory":
+        return MemorySessionStore()
+    if spec.startswith("sqlite:"):
+        return SQLiteSessionStore(spec[len("sqlite:"):])
+    raise ValueError(f"Unknown session store '{spec}'")
@@ -0,0 +1,115 @@
+"""
+Cold start benchmark of llm_app.py.
+
+Every measurement runs in a fresh interpreter, like a new container:
+
+- import time of the heavy dependencies, one module per interpreter;
+- first paint of the start screen: time until Streamlit's AppTest has run the
+  script once, and which heavy modules were imported by then.
+
+Usage:
+    python startup_benchmark.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = ["streamlit", "openai", "supabase", "httpx", "tiktoken", "dotenv"]
+# Modules that should not be needed to paint the start screen
+LAZY_MODULES = ["openai", "supabase", "tiktoken"]
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def measure_import(module: str):
+    """
+    Seconds to import a module in a fresh interpreter, or None if it is not installed.
+    """
+    result = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def first_paint(timeout: float):
+    """
+    Runs the start screen once in this interpreter and prints the timings as JSON.
+    """
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    imported = time.perf_counter()
+    app = AppTest.from_file("llm_app.py", default_timeout=timeout)
+    app.run()
+    painted = time.perf_counter()
+    print(json.dumps({
+        "import_streamlit": imported - start,
+        "first_paint": painted - imported,
+        "errors": len(app.exception) + len(app.error),
+        "loaded": [m for m in LAZY_MODULES if m in sys.modules]
+    }))
+
+
+def measure_first_paint(timeout: float) -> dict:
+    """
+    Runs first_paint() in a fresh interpreter; wall_time includes interpreter startup.
+    """
+    env = dict(os.environ)
+    # The start screen must render without real credentials
+    env.setdefault("OPEN_AI_KEY", "benchmark-key")
+    env.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+    env.setdefault("SUPABASE_KEY", "benchmark-key")
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, __file__, "--child", "--timeout", str(timeout)],
+                            capture_output=True, text=True, env=env)
+    wall_time = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"First paint failed:\n{result.stderr}")
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    data["wall_time"] = wall_time
+    return data
+
+
+def describe(values: list) -> str:
+    return f"median {statistics.median(values) * 1000:7.1f} ms  min {min(values) * 1000:7.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold start of llm_app.py")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        first_paint(args.timeout)
+        return
+
+    print("Import time (fresh interpreter per run)")
+    for module in MODULES:
+        times = [measure_import(module) for _ in range(args.runs)]
+        if None in times:
+            print(f"  {module:<10} not installed")
+        else:
+            print(f"  {module:<10} {describe(times)}")
+
+    runs = [measure_first_paint(args.timeout) for _ in range(args.runs)]
+    print("Start screen")
+    print(f"  {'import':<12} {describe([r['import_streamlit'] for r in runs])}")
+    print(f"  {'first paint':<12} {describe([r['first_paint'] for r in runs])}")
+    print(f"  {'cold start':<12} {describe([r['wall_time'] for r in runs])}")
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+    print(f"  Heavy modules loaded for the start screen: {', '.join(loaded) or 'none'}")
+    if any(r["errors"] for r in runs):
+        print("  Warning: the start screen rendered with errors")
+
+
+if __name__ == "__main__":
+    main()
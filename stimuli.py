@@ -0,0 +1,70 @@
+"""
+Loading of the canned study stimuli used by artificial_stimuli.py.
+
+Stimuli are read from a JSON (or YAML, if PyYAML is installed) file:
+
+    {
+      "default": "<id of the fallback response>",
+      "responses": [
+        {"id": "...", "keywords": ["..."], "priority": 0, "reasoning": "...", "output": "..."}
+      ]
+    }
+
+All keywords are compiled into one KeywordMatcher, and the streamed chunk
+sequence of every response is computed once at load time.
+"""
+import json
+import os
+
+from keyword_matcher import KeywordMatcher
+
+
+def split_chunks(text: str) -> tuple:
+    """
+    Splits a text into the words streamed one by one, keeping the separating spaces.
+    """
+    words = text.split(" ")
+    return tuple(word + " " for word in words[:-1]) + (words[-1],)
+
+
+def _read_file(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+            import yaml  # optional dependency, only needed for YAML stimulus files
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+class StimulusSet:
+    """
+    Responses of a stimulus file with their keyword matcher.
+    """
+
+    def __init__(self, data: dict):
+        self.responses = {}
+        self.matcher = KeywordMatcher()
+        for entry in data["responses"]:
+            response = {
+                "id": entry["id"],
+                "reasoning": entry.get("reasoning", ""),
+                "output": entry["output"]
+            }
+            response["reasoning_chunks"] = split_chunks(response["reasoning"])
+            response["output_chunks"] = split_chunks(response["output"])
+            self.responses[entry["id"]] = response
+            for keyword in entry.get("keywords", []):
+                self.matcher.add(keyword, response, entry.get("priority", 0))
+        self.matcher.build()
+        if data["default"] not in self.responses:
+            raise ValueError(f"Default response '{data['default']}' is not defined")
+        self.default = self.responses[data["default"]]
+
+    def match(self, user_input: str) -> dict:
+        """
+        Returns the response of the best-ranked keyword in the input, or the default.
+        """
+        return self.matcher.match(user_input, default=self.default)
+
+
+def load_stimuli(path: str) -> StimulusSet:
+    return StimulusSet(_read_file(path))
@@ -0,0 +1,287 @@
+"""
+Regression benchmark of the stream-processing hot path.
+
+Replays synthetic (or recorded) responses chunk by chunk through the code
+llm_app.py streams with: a Generation on the StreamingEngine loop runs the
+section budget check and StreamParser marker detection, and the consumer loop
+batches the events into placeholders with RenderScheduler. Placeholders are
+no-op sinks and typing-speed sleeps are disabled, so only the processing cost
+is measured. Budgets are unlimited by default, so every chunk of the long
+responses is parsed and rendered; --budgets applies the condition's budgets,
+which cut the long responses off.
+
+For every scenario (condition x response length x chunk size) it reports the
+best time per chunk read by the engine over the repeats (like timeit, the
+least noisy estimate), CPU time per response and peak memory allocated per
+response (tracemalloc, measured in a separate pass). Like timeit, each repeat
+runs the response as many times as it takes to last at least MIN_REPEAT_TIME.
+Results can be stored as a baseline and later runs compared against it. The
+comparison uses the "relative" cost: the median ratio of each repeat's time to
+a fixed calibration workload timed right before it, which evens out
+differences in machine speed and load. Comparisons need at least
+MIN_COMPARE_REPEATS repeats; fewer are too noisy for the threshold.
+
+Usage:
+    python stream_benchmark.py --save-baseline stream_benchmark_baseline.json
+    python stream_benchmark.py --baseline stream_benchmark_baseline.json
+    python stream_benchmark.py --recorded response.txt --conditions A1
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from async_engine import StreamingEngine
+from mock_llm_server import REASONING_TEXT, ANSWER_TEXT, CITATION, SOURCES_TEXT
+from profiles import get_profile, SectionBudget
+from stream_parser import StreamParser, REASONING_MARKER, ANSWER_MARKER, SOURCES_MARKER, REASONING, ANSWER, SOURCES
+from stream_render import RenderScheduler, RENDER_FPS, RENDER_MIN_CHARS
+
+CONDITIONS = ["A1", "A2", "A3"]
+LENGTHS = {"short": 1, "long": 12}  # repetitions of the mock response sections
+CHUNK_SIZES = [1, 4, 16]
+REPEATS = 20
+MIN_COMPARE_REPEATS = 20
+MIN_REPEAT_TIME = 0.01  # seconds
+REGRESSION_THRESHOLD = 0.25  # relative slowdown reported as a regression
+
+
+class NullPlaceholder:
+    """
+    Stands in for st.empty(); only counts the renders.
+    """
+
+    def __init__(self):
+        self.renders = 0
+
+    def markdown(self, text: str):
+        self.renders += 1
+
+
+def synthetic_response(condition: str, repeat: int) -> str:
+    """
+    A response in the structure of the condition, with every section repeated.
+    """
+    profile = get_profile(condition)
+    answer = "\n".join([ANSWER_TEXT.format(cite=CITATION if profile["has_sources"] else "")] * repeat)
+    text = ""
+    if profile["has_reasoning"]:
+        text += f"{REASONING_MARKER} {' '.join([REASONING_TEXT] * repeat)}\n\n{ANSWER_MARKER} "
+    text += answer
+    if profile["has_sources"]:
+        text += f"\n\n{SOURCES_MARKER}\n" + "\n".join([SOURCES_TEXT] * repeat)
+    return text
+
+
+def load_recorded(path: str):
+    """
+    A recorded response: a JSON list of deltas, or plain text to be chunked.
+    """
+    with open(path, encoding="utf-8") as f:
+        content = f.read()
+    if path.endswith(".json"):
+        return json.loads(content)
+    return content
+
+
+def chunked(text: str, size: int) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def replay_chunks(deltas: list) -> list:
+    """
+    The deltas as chat-completion-like chunks, in the shape of response_cache.replay_stream.
+    """
+    return [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))], usage=None)
+            for delta in deltas]
+
+
+def process(engine: StreamingEngine, chunks: list, condition: str, budgets: bool = False) -> tuple:
+    """
+    Streams one response through the engine and the render loop. Returns the
+    number of renders and the number of chunks the engine read, which is less
+    than len(chunks) when a budget cuts the response off.
+    """
+    profile = get_profile(condition)
+    parser = StreamParser(has_reasoning=profile["has_reasoning"], has_sources=profile["has_sources"])
+    # Unlimited budgets still run the check on every chunk
+    budget = SectionBudget(profile["section_budgets"] if budgets else {})
+    generation = engine.stream(iter(chunks), parser, budget)
+    renderer = RenderScheduler(fps=RENDER_FPS, min_chars=RENDER_MIN_CHARS, typing_speed=None,
+                               sleep=lambda seconds: None)
+    placeholders = [NullPlaceholder()]
+    if parser.has_reasoning:
+        renderer.attach(REASONING, placeholders[0])
+        placeholders.append(NullPlaceholder())
+    renderer.attach(ANSWER, placeholders[-1])
+
+    # The engine reads the whole replay first, so the two threads do not contend
+    # for the GIL and the timings stay comparable between runs
+    generation.done.wait()
+    # The consumer loop of llm_app.py without the Streamlit elements
+    for section, text in generation:
+        if not text:
+            if section == ANSWER:
+                renderer.finish_section(REASONING)
+            elif section == SOURCES:
+                renderer.finish_section(REASONING)
+                renderer.finish_section(ANSWER)
+                placeholders.append(NullPlaceholder())
+                renderer.attach(SOURCES, placeholders[-1], cursor=False)
+            continue
+        renderer.push(section, text)
+    renderer.finish()
+    return sum(p.renders for p in placeholders), generation.chunks
+
+
+def _workload():
+    parts = []
+    for i in range(5000):
+        parts.append(str(i))
+        if "99" in parts[-1]:
+            parts[-1] = parts[-1].strip()
+    "".join(parts)
+
+
+def _loops(fn) -> int:
+    """
+    Number of calls of fn that take at least MIN_REPEAT_TIME, like timeit's autorange.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= MIN_REPEAT_TIME:
+            return number
+        number *= 2
+
+
+def calibrate(number: int) -> float:
+    """
+    Seconds per call of a fixed pure-Python workload.
+    """
+    start = time.perf_counter()
+    for _ in range(number):
+        _workload()
+    return (time.perf_counter() - start) / number
+
+
+def measure(engine: StreamingEngine, chunks: list, condition: str, repeats: int, budgets: bool = False) -> dict:
+    wall_times = []
+    cpu_times = []
+    calibration_times = []
+    # Also the warm-up run
+    number = _loops(lambda: process(engine, chunks, condition, budgets))
+    calibration_number = _loops(_workload)
+    for _ in range(repeats):
+        calibration_times.append(calibrate(calibration_number))
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        for _ in range(number):
+            renders, read = process(engine, chunks, condition, budgets)
+        cpu_times.append((time.process_time() - cpu_start) / number)
+        wall_times.append((time.perf_counter() - wall_start) / number)
+
+    # Allocations are measured in their own pass, tracemalloc slows everything down
+    tracemalloc.start()
+    process(engine, chunks, condition, budgets)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "chunks": read,
+        "renders": renders,
+        "us_per_chunk": min(wall_times) / read * 1e6,
+        "cpu_ms": min(cpu_times) * 1e3,
+        "peak_kib": peak / 1024,
+        "relative": statistics.median(w / c for w, c in zip(wall_times, calibration_times)),
+        "repeats": repeats,
+        "budgets": budgets
+    }
+
+
+def scenarios(conditions: list, recorded: list):
+    for condition in conditions:
+        sources = [(name, synthetic_response(condition, repeat)) for name, repeat in LENGTHS.items()]
+        sources += [(path, load_recorded(path)) for path in recorded]
+        for name, response in sources:
+            if isinstance(response, list):
+                yield f"{condition}/{name}/recorded", condition, replay_chunks(response)
+                continue
+            for size in CHUNK_SIZES:
+                yield f"{condition}/{name}/{size}", condition, replay_chunks(chunked(response, size))
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Returns the scenarios whose relative cost grew beyond the threshold.
+    Raises ValueError if either side has fewer than MIN_COMPARE_REPEATS
+    repeats or they were measured with different budget settings.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for side in (result, before):
+            if side.get("repeats", 0) < MIN_COMPARE_REPEATS:
+                raise ValueError(f"{name}: comparisons need at least {MIN_COMPARE_REPEATS} repeats")
+        if result.get("budgets", False) != before.get("budgets", False):
+            raise ValueError(f"{name}: the baseline was measured with different budget settings")
+        if before is not None and result["relative"] > before["relative"] * (1 + threshold):
+            regressions.append(f"{name}: {before['relative']:.3f} -> {result['relative']:.3f} "
+                               f"({result['relative'] / before['relative'] - 1:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the stream parsing and render path")
+    parser.add_argument("--conditions", default=",".join(CONDITIONS))
+    parser.add_argument("--recorded", action="append", default=[],
+                        help="recorded response: JSON list of deltas or a text file")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--budgets", action="store_true", help="apply the section budgets of the conditions")
+    parser.add_argument("--baseline", help="compare with a stored baseline")
+    parser.add_argument("--save-baseline", help="store the results as baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+    if args.baseline and args.repeats < MIN_COMPARE_REPEATS:
+        parser.error(f"--baseline needs at least {MIN_COMPARE_REPEATS} repeats")
+
+    conditions = [c.strip() for c in args.conditions.split(",") if c.strip()]
+    # Replayed responses need no client
+    engine = StreamingEngine(lambda: None)
+    results = {}
+    print(f"{'scenario':<20} {'chunks':>7} {'renders':>8} {'us/chunk':>9} {'cpu ms':>8} {'peak KiB':>9} "
+          f"{'relative':>9}")
+    for name, condition, chunks in scenarios(conditions, args.recorded):
+        result = measure(engine, chunks, condition, args.repeats, args.budgets)
+        results[name] = result
+        print(f"{name:<20} {result['chunks']:>7} {result['renders']:>8} {result['us_per_chunk']:>9.2f} "
+              f"{result['cpu_ms']:>8.2f} {result['peak_kib']:>9.1f} {result['relative']:>9.3f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        try:
+            regressions = compare(results, baseline, args.threshold)
+        except ValueError as e:
+            sys.exit(str(e))
+        if regressions:
+            print(f"Regressions beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Incremental parser for the structured responses of the A1-A4 conditions.
+
+The model answers with an optional 'REASONING:' part, an 'ANSWER:' part and an
+optional '### Sources:' part. Instead of re-scanning the whole response after
+every chunk, the parser is fed one delta at a time and emits section-tagged
+text events. Markers that are split across chunk boundaries are held back
+until the next delta decides them.
+"""
+
+REASONING = "reasoning"
+ANSWER = "answer"
+SOURCES = "sources"
+
+REASONING_MARKER = "REASONING:"
+ANSWER_MARKER = "ANSWER:"
+SOURCES_MARKER = "### Sources:"
+
+
+class StreamParser:
+    """
+    State machine over the REASONING / ANSWER / Sources sections.
+
+    feed() returns a list of (section, text) events. An event with empty text
+    is emitted whenever a new section starts, so the caller can set up the
+    matching UI element before any text of that section arrives.
+    """
+
+    def __init__(self, has_reasoning: bool = False, has_sources: bool = False):
+        self.has_reasoning = has_reasoning
+        self.has_sources = has_sources
+        self.section = REASONING if has_reasoning else ANSWER
+        self.sections = {REASONING: [], ANSWER: [], SOURCES: []}
+        self.raw = []
+        self._pending = ""
+        self._at_section_start = True
+        self._started = False
+        self.seen = {self.section}
+        self.muted = set()
+
+    def _markers(self):
+        """
+        Markers that can still change the parser state from the current section.
+        """
+        if self.section == REASONING:
+            markers = [(REASONING_MARKER, REASONING), (ANSWER_MARKER, ANSWER)]
+            if self.has_sources:
+                markers.append((SOURCES_MARKER, SOURCES))
+            return markers
+        if self.section == ANSWER and self.has_sources:
+            return [(SOURCES_MARKER, SOURCES)]
+        return []
+
+    def mute(self, section: str):
+        """
+        Drops further text of a section, e.g. once it is over its token budget.
+        Markers are still detected, so later sections are parsed as usual.
+        """
+        self.muted.add(section)
+
+    def _emit(self, events, text: str):
+        if not self._started:
+            # Announce the first section once, even if it stays empty
+            events.append((self.section, ""))
+            self._started = True
+        if self.section in self.muted:
+            return
+        if self._at_section_start:
+            # Sections are displayed stripped, so drop leading whitespace
+            text = text.lstrip()
+            if not text:
+                return
+            self._at_section_start = False
+        if text:
+            self.sections[self.section].append(text)
+            events.append((self.section, text))
+
+    def _switch(self, events, section: str):
+        if section == self.section:
+            # A repeated REASONING: marker is simply dropped
+            return
+        self.section = section
+        self.seen.add(section)
+        self._at_section_start = True
+        events.append((section, ""))
+
+    @staticmethod
+    def _partial_marker_len(text: str, markers) -> int:
+        """
+        Length of the longest suffix of text that is a proper prefix of a marker.
+        """
+        longest = 0
+        for marker, _ in markers:
+            for size in range(min(len(marker) - 1, len(text)), longest, -1):
+                if text.endswith(marker[:size]):
+                    longest = size
+                    break
+        return longest
+
+    def feed(self, delta: str):
+        """
+        Consumes one streamed delta and returns the resulting events.
+        """
+        events = []
+        if not self._started:
+            self._emit(events, "")
+        if not delta:
+            return events
+        self.raw.append(delta)
+        buf = self._pending + delta
+        while True:
+            markers = self._markers()
+            best = None
+            for marker, target in markers:
+                index = buf.find(marker)
+                if index != -1 and (best is None or index < best[0]):
+                    best = (index, marker, target)
+            if best is None:
+                break
+            index, marker, target = best
+            self._emit(events, buf[:index])
+            self._switch(events, target)
+            buf = buf[index + len(marker):]
+
+        hold = self._partial_marker_len(buf, self._markers())
+        self._emit(events, buf[:len(buf) - hold])
+        self._pending = buf[len(buf) - hold:]
+        return events
+
+    def finish(self):
+        """
+        Flushes any held-back text at the end of the stream.
+        """
+        events = []
+        pending, self._pending = self._pending, ""
+        self._emit(events, pending)
+        return events
+
+    def text(self, section: str) -> str:
+        """
+        Returns the stripped text collected so far for a section.
+        """
+        return "".join(self.sections[section]).strip()
+
+    def result(self) -> dict:
+        """
+        The parsed sections of the response. Sections that did not occur are None.
+
+        If a reasoning condition never reached 'ANSWER:', the model did not follow
+        the structure and the whole response is treated as the answer.
+        """
+        if self.has_reasoning and ANSWER not in self.seen:
+            return {REASONING: None, ANSWER: self.full_response.strip(), SOURCES: None}
+        return {
+            REASONING: self.text(REASONING) if REASONING in self.seen else None,
+            ANSWER: self.text(ANSWER),
+            SOURCES: self.text(SOURCES) if SOURCES in self.seen else None
+        }
+
+    @property
+    def full_response(self) -> str:
+        """
+        The raw response exactly as received from the model.
+        """
+        return "".join(self.raw)
+
+
+def parse_response(content: str, has_reasoning: bool = False, has_sources: bool = False) -> dict:
+    """
+    Parses a complete response into the same section model as the streaming path.
+    """
+    parser = StreamParser(has_reasoning=has_reasoning, has_sources=has_sources)
+    parser.feed(content)
+    parser.finish()
+    return parser.result()
@@ -0,0 +1,147 @@
+"""
+Coalesced rendering of streamed sections into Streamlit placeholders.
+
+Calling placeholder.markdown() for every delta re-sends the whole accumulated
+markdown over the websocket. The scheduler collects deltas per section and only
+re-renders at a fixed frame rate or once enough new characters have arrived.
+An optional typing speed reveals the text at a steady pace without sleeping
+between network reads.
+"""
+import time
+
+# Default render settings
+RENDER_FPS = 10
+RENDER_MIN_CHARS = 200
+CURSOR = "▌"
+
+
+class _SectionState:
+    def __init__(self, placeholder, cursor: bool):
+        self.placeholder = placeholder
+        self.cursor = cursor
+        self.chunks = []
+        self.length = 0
+        self.revealed = 0.0
+        self.rendered = 0
+        self.finished = False
+
+    def text(self, limit: int) -> str:
+        if len(self.chunks) > 1:
+            self.chunks = ["".join(self.chunks)]
+        return self.chunks[0][:limit] if self.chunks else ""
+
+
+class RenderScheduler:
+    """
+    Batches section text and flushes it to placeholders.
+
+    A flush happens when 1 / fps seconds have passed since the last one or when
+    min_chars characters are waiting. typing_speed (characters per second)
+    limits how fast text is revealed; None shows text as soon as it arrives.
+    """
+
+    def __init__(self, fps: float = RENDER_FPS, min_chars: int = RENDER_MIN_CHARS,
+                 typing_speed: float = None, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1.0 / fps
+        self.min_chars = min_chars
+        self.typing_speed = typing_speed
+        self.clock = clock
+        self.sleep = sleep
+        self.sections = {}
+        self.render_count = 0
+        self.sleep_time = 0.0
+        self._last_flush = clock()
+        self._last_tick = self._last_flush
+        self._behind = False
+
+    def attach(self, section: str, placeholder, cursor: bool = True):
+        """
+        Registers the placeholder that displays a section.
+        """
+        self.sections[section] = _SectionState(placeholder, cursor)
+
+    def push(self, section: str, text: str):
+        """
+        Adds streamed text to a section and flushes if a frame is due.
+        """
+        state = self.sections[section]
+        state.chunks.append(text)
+        state.length += len(text)
+        self.tick()
+
+    def _advance(self, now: float):
+        # Time spent waiting on the network with nothing left to reveal earns no credit
+        elapsed = now - self._last_tick if self._behind else 0.0
+        self._last_tick = now
+        self._behind = False
+        for state in self.sections.values():
+            if state.finished or state.revealed >= state.length:
+                continue
+            if self.typing_speed is None:
+                state.revealed = state.length
+                continue
+            state.revealed = min(state.length, state.revealed + self.typing_speed * elapsed)
+            self._behind = True
+            # With a typing speed, sections are revealed one after another
+            break
+
+    def tick(self):
+        """
+        Flushes pending text if the frame interval or character threshold is reached.
+        """
+        now = self.clock()
+        self._advance(now)
+        waiting = sum(int(s.revealed) - s.rendered for s in self.sections.values() if not s.finished)
+        if waiting and (now - self._last_flush >= self.interval or waiting >= self.min_chars):
+            self.flush()
+
+    def reveal(self, section: str):
+        """
+        Shows all text of a section received so far at once, e.g. the text
+        buffered during a pause. Later text is revealed at typing speed again.
+        """
+        state = self.sections.get(section)
+        if state is None or state.finished:
+            return
+        state.revealed = state.length
+        self._last_tick = self.clock()
+        self._behind = False
+        self.flush()
+
+    def flush(self):
+        """
+        Renders every section that has unrendered text.
+        """
+        self._last_flush = self.clock()
+        for state in self.sections.values():
+            visible = int(state.revealed)
+            if state.finished or visible == state.rendered:
+                continue
+            text = state.text(visible).strip()
+            state.placeholder.markdown(text + CURSOR if state.cursor else text)
+            state.rendered = visible
+            self.render_count += 1
+
+    def finish_section(self, section: str):
+        """
+        Reveals the rest of a section at typing speed and renders it without cursor.
+        """
+        state = self.sections.get(section)
+        if state is None or state.finished:
+            return
+        while self.typing_speed is not None and state.revealed < state.length:
+            self.sleep(self.interval)
+            self.sleep_time += self.interval
+            self.tick()
+        state.revealed = state.length
+        state.placeholder.markdown(state.text(state.length).strip())
+        state.rendered = state.length
+        state.finished = True
+        self.render_count += 1
+
+    def finish(self):
+        """
+        Final flush at the end of the stream.
+        """
+        for section in list(self.sections):
+            self.finish_section(section)
@@ -0,0 +1,74 @@
+"""
+Tests for the local conversation log, in particular its crash recovery.
+"""
+import json
+import os
+
+from conversation_log import ConversationLog, INDEX_FILE, _segment_name
+
+
+def write_log(directory: str) -> ConversationLog:
+    log = ConversationLog(directory, fsync_interval=60)
+    log.append("s1", "turn", messages=[{"role": "user", "content": "hi"}], metrics=[{"ttft": 0.5}])
+    log.append("s2", "turn", messages=[{"role": "user", "content": "hello"}])
+    log.append("s1", "end", messages=[{"role": "assistant", "content": "bye"}])
+    log.flush()
+    return log
+
+
+def test_load_rebuilds_conversation(tmp_path):
+    write_log(str(tmp_path))
+    row = ConversationLog(str(tmp_path)).load("s1")
+    assert row["conversation"] == [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "bye"}]
+    assert row["metrics"] == [{"ttft": 0.5}]
+    assert row["ended"] is True
+
+
+def test_torn_tail_is_truncated_and_index_rebuilt(tmp_path):
+    directory = str(tmp_path)
+    write_log(directory)
+    segment = os.path.join(directory, _segment_name(1))
+    index = os.path.join(directory, INDEX_FILE)
+    # A crash after the segment write but before the index write, with a torn last record
+    with open(segment, "ab") as f:
+        f.write(b'{"session_id":"s3","type":"turn","messages":[]}\n{"session_id":"s3","ty')
+    with open(index, "rb") as f:
+        lines = f.readlines()
+    with open(index, "wb") as f:
+        f.writelines(lines[:1])
+
+    log = ConversationLog(directory)
+
+    assert sorted(log.session_ids()) == ["s1", "s2", "s3"]
+    with open(segment, "rb") as f:
+        assert f.read().endswith(b"\n")
+    with open(index, encoding="utf-8") as f:
+        indexed = [json.loads(line)["id"] for line in f]
+    assert sorted(indexed) == ["s1", "s1", "s2", "s3"]
+    # New appends start on a clean line and stay readable
+    log.append("s4", "turn", messages=[{"role": "user", "content": "new"}])
+    log.flush()
+    assert ConversationLog(directory).load("s4")["conversation"] == [{"role": "user", "content": "new"}]
+    assert ConversationLog(directory).load("s1")["ended"] is True
+
+
+def test_read_only_log_changes_nothing(tmp_path):
+    directory = str(tmp_path)
+    write_log(directory)
+    segment = os.path.join(directory, _segment_name(1))
+    with open(segment, "ab") as f:
+        f.write(b'{"session_id":"s3","type":"turn","messages":[]}\n{"session_')
+    before = {name: open(os.path.join(directory, name), "rb").read() for name in os.listdir(directory)}
+
+    log = ConversationLog(directory, read_only=True)
+
+    assert sorted(row["conversation_id"] for row in log.conversations()) == ["s1", "s2", "s3"]
+    after = {name: open(os.path.join(directory, name), "rb").read() for name in os.listdir(directory)}
+    assert after == before
+
+
+def test_read_only_missing_directory_is_empty(tmp_path):
+    directory = str(tmp_path / "conversations")
+    log = ConversationLog(directory, read_only=True)
+    assert list(log.conversations()) == []
+    assert not os.path.exists(directory)
@@ -0,0 +1,41 @@
+"""
+Tests for the response cache lookups.
+"""
+from response_cache import ResponseCache
+
+SYSTEM_PROMPT = "You are a supportive assistant."
+
+
+def conversation(*contents) -> list:
+    roles = ["user", "assistant"]
+    return [{"role": "system", "content": SYSTEM_PROMPT}] + [
+        {"role": roles[i % 2], "content": content} for i, content in enumerate(contents)
+    ]
+
+
+def test_exact_match():
+    cache = ResponseCache()
+    cache.put("A1", SYSTEM_PROMPT, conversation("I can't sleep."), "Try a routine.")
+    assert cache.get("A1", SYSTEM_PROMPT, conversation("i can't sleep")) == "Try a routine."
+    assert cache.get("A2", SYSTEM_PROMPT, conversation("I can't sleep.")) is None
+
+
+def test_near_duplicate_first_turn():
+    cache = ResponseCache(near_duplicates=True)
+    cache.put("A1", SYSTEM_PROMPT, conversation("I have trouble sleeping at night"), "Try a routine.")
+    assert cache.get("A1", SYSTEM_PROMPT, conversation("I have trouble sleeping at nights")) == "Try a routine."
+    assert cache.stats["near_hits"] == 1
+
+
+def test_near_duplicate_ignores_later_turns():
+    long_answer = "It sounds like you have been through a lot lately. " * 20
+    history = ["I feel very low these days.", long_answer]
+    cache = ResponseCache(near_duplicates=True)
+    cache.put("A1", SYSTEM_PROMPT, conversation(*history, "Thanks, that helps."), "You are welcome!")
+    follow_up = conversation(*history, "Thanks, that helps.", "You are welcome!",
+                             "He told me he has a plan to kill himself.")
+    assert cache.get("A1", SYSTEM_PROMPT, follow_up) is None
+    # The same history with a different new message must not match either
+    different = conversation(*history, "He told me he has a plan to kill himself.")
+    assert cache.get("A1", SYSTEM_PROMPT, different) is None
+    assert cache.stats["near_hits"] == 0
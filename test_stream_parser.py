@@ -0,0 +1,142 @@
+"""
+Tests for the incremental StreamParser: any chunking of a response must give
+the same sections as parsing it in one piece.
+"""
+import random
+
+import pytest
+
+from stream_parser import (
+    StreamParser, parse_response, REASONING, ANSWER, SOURCES, REASONING_MARKER, ANSWER_MARKER, SOURCES_MARKER
+)
+
+REASONING_TEXT = "The user feels overwhelmed; suggest small, concrete steps."
+ANSWER_TEXT = "Try to break tasks into small steps **[Smith et al., 2020]**.\n- Take short breaks"
+SOURCES_TEXT = "Smith, A. B. (2020). Everyday strategies. Journal of Mental Health, 12(3), 45-67."
+
+# Condition -> (has_reasoning, has_sources)
+CONDITIONS = {"A1": (True, True), "A2": (True, False), "A3": (False, True), "A4": (False, False)}
+
+
+def build_response(has_reasoning: bool, has_sources: bool) -> str:
+    text = f"{REASONING_MARKER} {REASONING_TEXT}\n\n{ANSWER_MARKER} " if has_reasoning else ""
+    text += ANSWER_TEXT
+    if has_sources:
+        text += f"\n\n{SOURCES_MARKER}\n{SOURCES_TEXT}"
+    return text
+
+
+def stream(chunks, has_reasoning: bool, has_sources: bool) -> StreamParser:
+    parser = StreamParser(has_reasoning=has_reasoning, has_sources=has_sources)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.finish()
+    return parser
+
+
+def one_char_chunks(text: str) -> list:
+    return list(text)
+
+
+def random_chunks(text: str, seed: int) -> list:
+    rng = random.Random(seed)
+    chunks, i = [], 0
+    while i < len(text):
+        size = rng.randint(1, 12)
+        chunks.append(text[i:i + size])
+        i += size
+    return chunks
+
+
+def marker_splitting_chunks(text: str) -> list:
+    """
+    Cuts the text in the middle of every marker.
+    """
+    cuts = set()
+    for marker in (REASONING_MARKER, ANSWER_MARKER, SOURCES_MARKER):
+        index = text.find(marker)
+        while index != -1:
+            cuts.update({index + 1, index + len(marker) // 2, index + len(marker) - 1})
+            index = text.find(marker, index + 1)
+    bounds = [0] + sorted(cuts) + [len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+@pytest.mark.parametrize("condition", sorted(CONDITIONS))
+@pytest.mark.parametrize("chunking", [
+    one_char_chunks,
+    marker_splitting_chunks,
+    *[lambda text, seed=seed: random_chunks(text, seed) for seed in range(20)]
+])
+def test_chunking_matches_parse_response(condition, chunking):
+    has_reasoning, has_sources = CONDITIONS[condition]
+    text = build_response(has_reasoning, has_sources)
+    expected = parse_response(text, has_reasoning, has_sources)
+
+    parser = stream(chunking(text), has_reasoning, has_sources)
+
+    assert parser.result() == expected
+    assert parser.full_response == text
+    assert expected[ANSWER] == ANSWER_TEXT
+    assert expected[REASONING] == (REASONING_TEXT if has_reasoning else None)
+    assert expected[SOURCES] == (SOURCES_TEXT if has_sources else None)
+
+
+def test_section_start_events_are_emitted_once():
+    text = build_response(True, True)
+    parser = StreamParser(has_reasoning=True, has_sources=True)
+    events = []
+    for chunk in one_char_chunks(text):
+        events.extend(parser.feed(chunk))
+    events.extend(parser.finish())
+    starts = [section for section, text in events if not text]
+    assert starts == [REASONING, ANSWER, SOURCES]
+
+
+def test_repeated_reasoning_marker_is_dropped():
+    text = f"{REASONING_MARKER} first {REASONING_MARKER} second\n{ANSWER_MARKER} done"
+    for chunks in (one_char_chunks(text), marker_splitting_chunks(text)):
+        result = stream(chunks, True, False).result()
+        assert result == parse_response(text, True, False)
+        assert REASONING_MARKER not in result[REASONING]
+        assert result[REASONING].startswith("first") and result[REASONING].endswith("second")
+        assert result[ANSWER] == "done"
+
+
+def test_missing_answer_marker_falls_back_to_whole_response():
+    text = f"{REASONING_MARKER} I only thought about it"
+    result = stream(one_char_chunks(text), True, True).result()
+    assert result == parse_response(text, True, True)
+    assert result == {REASONING: None, ANSWER: text, SOURCES: None}
+
+
+def test_finish_flushes_stream_ending_inside_marker():
+    text = f"{ANSWER_MARKER} Keep a routine ### Sour"
+    parser = StreamParser(has_reasoning=False, has_sources=True)
+    events = []
+    for chunk in one_char_chunks(text):
+        events.extend(parser.feed(chunk))
+    # The partial marker is held back until the stream ends
+    assert "".join(t for s, t in events if s == ANSWER).endswith("routine ")
+    events.extend(parser.finish())
+    assert "".join(t for s, t in events if s == ANSWER).endswith("### Sour")
+    assert parser.result()[SOURCES] is None
+    assert parser.result() == parse_response(text, False, True)
+
+
+def test_muted_section_is_dropped_from_events_and_result():
+    text = build_response(True, True)
+    parser = StreamParser(has_reasoning=True, has_sources=True)
+    events = []
+    for i, chunk in enumerate(one_char_chunks(text)):
+        if i == 20:
+            # Over budget part way through the reasoning
+            parser.mute(REASONING)
+        events.extend(parser.feed(chunk))
+    events.extend(parser.finish())
+    shown = "".join(t for s, t in events if s == REASONING).strip()
+    result = parser.result()
+    assert result[REASONING] == shown
+    assert len(shown) < len(REASONING_TEXT)
+    assert result[ANSWER] == ANSWER_TEXT
+    assert result[SOURCES] == SOURCES_TEXT